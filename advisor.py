@@ -0,0 +1,242 @@
+# advisor.py
+# Pure advisory logic shared by the Streamlit app, the SMS/IVR service and the batch tools.
+
+import hashlib
+import io
+import os
+import random
+from datetime import date, timedelta
+
+import numpy as np
+from PIL import Image, ImageStat
+
+import localization
+import metrics
+from cache_utils import LRUCache
+from scenarios import DEFAULT_DELAYS, expected_price_change, rain_probability, scenario_table
+
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Weather the SMS/IVR flow assumes, since a keypad farmer only sends N, P, K and pH.
+SMS_DEFAULT_TEMPERATURE, SMS_DEFAULT_HUMIDITY, SMS_DEFAULT_RAINFALL = 26.0, 80.0, 120.0
+
+# Largest magnitude the model's float32 inputs can hold; larger values become infinity.
+FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+# Soil-test levels the fertilizer plan is balanced against.
+REFERENCE_N, REFERENCE_P = 90, 42
+
+# Harvest advice: hold the crop for its best delay when that is expected to earn at least
+# WAIT_MIN_GAIN more than harvesting at maturity, and urge an early harvest when a week's
+# wait is expected to lose HARVEST_NOW_MIN_LOSS or more.
+WAIT_MIN_GAIN, HARVEST_NOW_MIN_LOSS = 0.005, 0.02
+
+# JPEG soil photos are decoded at the smallest 1/2, 1/4 or 1/8 scale that keeps at least this size.
+SOIL_ANALYSIS_SIZE = 512
+# Results for recently seen photos, keyed by a hash of the uploaded bytes.
+_soil_cache = LRUCache(maxsize=256)
+metrics.register_cache('soil_image', _soil_cache.stats)
+# Scenario tables by (days since sowing, crops); they only change from one day to the next.
+_scenario_cache = LRUCache(maxsize=64)
+metrics.register_cache('profit_scenarios', _scenario_cache.stats)
+
+# --- KNOWLEDGE BASES ---
+# Crop action plans, threats and advice templates live in locales/<lang>.json (see localization.py).
+
+# Per-acre economics for every crop the model recommends. yield_cv is the season-to-season
+# spread of yields, price_volatility the annual volatility of mandi prices and decay_per_day
+# the share of a mature crop lost for each day it stays in the field (see scenarios.py).
+CROP_DATA = {
+    "rice": {"yield_per_acre": 22, "market_price_per_quintal": 2050, "maturity_days": 120, "cost_per_acre": 28000, "yield_cv": 0.2, "price_volatility": 0.15, "decay_per_day": 0.002},
+    "maize": {"yield_per_acre": 25, "market_price_per_quintal": 2100, "maturity_days": 100, "cost_per_acre": 22000, "yield_cv": 0.25, "price_volatility": 0.2, "decay_per_day": 0.002},
+    "chickpea": {"yield_per_acre": 8, "market_price_per_quintal": 5400, "maturity_days": 110, "cost_per_acre": 18000, "yield_cv": 0.3, "price_volatility": 0.2, "decay_per_day": 0.001},
+    "kidneybeans": {"yield_per_acre": 7, "market_price_per_quintal": 7000, "maturity_days": 100, "cost_per_acre": 20000, "yield_cv": 0.3, "price_volatility": 0.25, "decay_per_day": 0.001},
+    "pigeonpeas": {"yield_per_acre": 8, "market_price_per_quintal": 6500, "maturity_days": 150, "cost_per_acre": 20000, "yield_cv": 0.3, "price_volatility": 0.25, "decay_per_day": 0.001},
+    "mothbeans": {"yield_per_acre": 4, "market_price_per_quintal": 6000, "maturity_days": 75, "cost_per_acre": 10000, "yield_cv": 0.35, "price_volatility": 0.25, "decay_per_day": 0.001},
+    "mungbean": {"yield_per_acre": 5, "market_price_per_quintal": 7700, "maturity_days": 65, "cost_per_acre": 14000, "yield_cv": 0.3, "price_volatility": 0.25, "decay_per_day": 0.0015},
+    "blackgram": {"yield_per_acre": 5, "market_price_per_quintal": 6900, "maturity_days": 80, "cost_per_acre": 14000, "yield_cv": 0.3, "price_volatility": 0.25, "decay_per_day": 0.0015},
+    "lentil": {"yield_per_acre": 6, "market_price_per_quintal": 6000, "maturity_days": 120, "cost_per_acre": 15000, "yield_cv": 0.3, "price_volatility": 0.2, "decay_per_day": 0.001},
+    "pomegranate": {"yield_per_acre": 40, "market_price_per_quintal": 6000, "maturity_days": 180, "cost_per_acre": 120000, "yield_cv": 0.3, "price_volatility": 0.35, "decay_per_day": 0.01},
+    "banana": {"yield_per_acre": 120, "market_price_per_quintal": 1200, "maturity_days": 300, "cost_per_acre": 90000, "yield_cv": 0.2, "price_volatility": 0.35, "decay_per_day": 0.015},
+    "mango": {"yield_per_acre": 30, "market_price_per_quintal": 4000, "maturity_days": 150, "cost_per_acre": 50000, "yield_cv": 0.35, "price_volatility": 0.35, "decay_per_day": 0.015},
+    "grapes": {"yield_per_acre": 80, "market_price_per_quintal": 4000, "maturity_days": 150, "cost_per_acre": 200000, "yield_cv": 0.25, "price_volatility": 0.35, "decay_per_day": 0.02},
+    "watermelon": {"yield_per_acre": 100, "market_price_per_quintal": 800, "maturity_days": 85, "cost_per_acre": 35000, "yield_cv": 0.3, "price_volatility": 0.45, "decay_per_day": 0.02},
+    "muskmelon": {"yield_per_acre": 60, "market_price_per_quintal": 1500, "maturity_days": 90, "cost_per_acre": 35000, "yield_cv": 0.3, "price_volatility": 0.45, "decay_per_day": 0.02},
+    "apple": {"yield_per_acre": 40, "market_price_per_quintal": 6000, "maturity_days": 180, "cost_per_acre": 100000, "yield_cv": 0.3, "price_volatility": 0.3, "decay_per_day": 0.004},
+    "orange": {"yield_per_acre": 50, "market_price_per_quintal": 3000, "maturity_days": 240, "cost_per_acre": 60000, "yield_cv": 0.3, "price_volatility": 0.3, "decay_per_day": 0.006},
+    "papaya": {"yield_per_acre": 150, "market_price_per_quintal": 1000, "maturity_days": 270, "cost_per_acre": 70000, "yield_cv": 0.25, "price_volatility": 0.4, "decay_per_day": 0.02},
+    "coconut": {"yield_per_acre": 10, "market_price_per_quintal": 11000, "maturity_days": 365, "cost_per_acre": 35000, "yield_cv": 0.15, "price_volatility": 0.15, "decay_per_day": 0.001},
+    "cotton": {"yield_per_acre": 8, "market_price_per_quintal": 6600, "maturity_days": 160, "cost_per_acre": 25000, "yield_cv": 0.3, "price_volatility": 0.2, "decay_per_day": 0.002},
+    "jute": {"yield_per_acre": 10, "market_price_per_quintal": 5000, "maturity_days": 120, "cost_per_acre": 22000, "yield_cv": 0.25, "price_volatility": 0.2, "decay_per_day": 0.002},
+    "coffee": {"yield_per_acre": 4, "market_price_per_quintal": 15000, "maturity_days": 365, "cost_per_acre": 40000, "yield_cv": 0.25, "price_volatility": 0.25, "decay_per_day": 0.001}
+}
+
+# --- AI LOGIC FUNCTIONS ---
+def _read_image_bytes(image_file):
+    """Raw bytes of an uploaded file, file object or path, leaving file objects where they were."""
+    if isinstance(image_file, (bytes, bytearray)):
+        return bytes(image_file)
+    if isinstance(image_file, (str, os.PathLike)):
+        with open(image_file, 'rb') as f:
+            return f.read()
+    if hasattr(image_file, 'getvalue'):
+        return image_file.getvalue()
+    position = image_file.tell()
+    data = image_file.read()
+    image_file.seek(position)
+    return data
+
+def soil_brightness(data):
+    """
+    Mean RGB brightness of an encoded soil photo. JPEGs are decoded straight at reduced
+    resolution (Pillow's draft mode) and the mean comes from band histograms, so no
+    full-size pixel array is ever built.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (SOIL_ANALYSIS_SIZE, SOIL_ANALYSIS_SIZE))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return sum(ImageStat.Stat(img).mean) / 3
+
+def image_preview(data, max_side=800):
+    """JPEG thumbnail of an uploaded photo for on-screen display, decoded in draft mode where possible."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (max_side, max_side))
+        img = img.convert('RGB')
+        img.thumbnail((max_side, max_side))
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=85)
+    return buf.getvalue()
+
+@metrics.timed
+def analyze_soil_image(image_file):
+    data = _read_image_bytes(image_file)
+    key = hashlib.blake2b(data, digest_size=16).digest()
+    result = _soil_cache.get(key)
+    if result is None:
+        brightness = soil_brightness(data)
+        if brightness < 80: result = {"soil_type": "Clay Loam", "organic_matter_estimate": "High"}
+        elif brightness < 140: result = {"soil_type": "Loamy Soil", "organic_matter_estimate": "Moderate"}
+        else: result = {"soil_type": "Sandy Soil", "organic_matter_estimate": "Low"}
+        _soil_cache.put(key, result)
+    return dict(result)
+
+def fertilizer_doses(n, p):
+    """
+    Urea and DAP doses (kg) for the given Nitrogen / Phosphorus readings.
+    Works on plain numbers or on whole NumPy/pandas columns at once.
+    Returns (n_diff, rec_urea, rec_dap); n_diff > 0 means the soil is low in Nitrogen.
+    """
+    n_diff = REFERENCE_N - np.asarray(n, dtype=np.float64)
+    p_diff = REFERENCE_P - np.asarray(p, dtype=np.float64)
+    rec_urea = 50 + (n_diff / 10) * 5
+    rec_dap = 50 + (p_diff / 10) * 2.5
+    return n_diff, rec_urea, rec_dap
+
+@metrics.timed
+def build_crop_plan(crop, data, lang, doses=None):
+    """
+    Action plan for an already-predicted crop, with the fertilizer advice for this soil test.
+    `doses` may pass in a precomputed (n_diff, rec_urea, rec_dap) from fertilizer_doses.
+    """
+    # Copy so the personalised step never leaks into the shared knowledge base.
+    res = localization.resources(lang)
+    action_plan = dict(res['crop_action_plans'].get(crop.lower(), {}))
+    n_diff, rec_urea, rec_dap = doses if doses is not None else fertilizer_doses(data[0], data[1])
+    status = res['nitrogen_status']['low' if n_diff > 0 else 'high']
+    action_plan["🌿 Personalized Fertilizer Plan"] = [res['fertilizer_advice'].format(status=status, urea=rec_urea)]
+    return {'recommended_crop': crop, 'action_plan': action_plan}
+
+@metrics.timed
+def predict_crop_and_plan(crop_model, data, lang):
+    prediction_result = crop_model.predict([data])[0]
+    return build_crop_plan(prediction_result, data, lang)
+
+def sms_features(n, p, k, ph):
+    """Full model feature row for an SMS/IVR soil test."""
+    return [n, p, k, SMS_DEFAULT_TEMPERATURE, SMS_DEFAULT_HUMIDITY, ph, SMS_DEFAULT_RAINFALL]
+
+def normalize_columns(frame, columns=FEATURE_COLUMNS, required=None, aliases=None, source="Soil-test file"):
+    """
+    Map header spellings like 'n', ' PH ' or 'Rainfall' onto `columns`, plus any lower-case
+    `aliases` ({'language': 'lang'}). Raises ValueError naming the `required` columns
+    (default: all of `columns`) that are missing.
+    """
+    lookup = {col.lower(): col for col in columns}
+    lookup.update(aliases or {})
+    renamed = {col: lookup[col.strip().lower()] for col in frame.columns if col.strip().lower() in lookup}
+    frame = frame.rename(columns=renamed)
+    missing = [col for col in (columns if required is None else required) if col not in frame.columns]
+    if missing:
+        raise ValueError(f"{source} is missing columns: {', '.join(missing)}")
+    return frame
+
+def scoreable_rows(features):
+    """True for each row whose values are all finite and fit the model's float32 inputs (NaN fails too)."""
+    return (np.abs(np.asarray(features, dtype=np.float64)) <= FLOAT32_MAX).all(axis=1)
+
+def sms_template(lang, markdown=True):
+    """The SMS template for `lang`. The locales mark the crop up in bold for the app; a phone shows `**` literally, so gateways get markdown=False."""
+    template = localization.resources(lang)['sms_template']
+    return template if markdown else template.replace('**', '')
+
+def sms_message(phone, crop_name, lang, markdown=True):
+    return sms_template(lang, markdown).format(phone=phone, crop_name=crop_name)
+
+@metrics.timed
+def diagnose_threat(lang):
+    threats = ["fall_armyworm", "leaf_blight", "amaranthus_viridis"]
+    t = random.choice(threats)
+    info = localization.resources(lang)['threats'].get(t, {"type": "Unknown", "solution": "No solution."})
+    return {'threat_name': t.replace('_', ' ').title(), 'threat_type': info['type'], 'recommended_action': info['solution']}
+
+@metrics.timed
+def get_watering_advice(soil_type, lang):
+    weather = {"temp": round(random.uniform(24, 32), 1), "humidity": random.randint(55, 85), "forecast": random.choice(["Sunny","Cloudy","Rain"])}
+    advice_key = 'default'
+    if "Rain" in weather['forecast']: advice_key = 'rain_expected'
+    elif "Sandy" in soil_type and weather['temp'] > 28: advice_key = 'sandy_hot'
+    elif "Clay" in soil_type and weather['temp'] < 26: advice_key = 'clay_cool'
+    elif weather['temp'] > 30: advice_key = 'hot_day'
+    return {"weather": weather, "advice": localization.resources(lang)['watering_advice'].get(advice_key)}
+
+@metrics.timed
+def profit_scenarios(days_since_sowing=0, crops=None):
+    """
+    Monte Carlo revenue/profit per acre for `crops` (default: every crop in CROP_DATA)
+    and each harvest delay in DEFAULT_DELAYS; see scenarios.scenario_table for the rows.
+    The rows are shared between callers and must not be modified.
+    """
+    key = (days_since_sowing, None if crops is None else tuple(crops))
+    rows = _scenario_cache.get(key)
+    if rows is None:
+        rows = scenario_table(CROP_DATA, crops, days_since_sowing=days_since_sowing)
+        _scenario_cache.put(key, rows)
+    return rows
+
+@metrics.timed
+def get_harvest_advice(crop_name, sowing_date, lang):
+    crop = crop_name.lower()
+    crop_info = CROP_DATA.get(crop, {})
+    days = crop_info.get("maturity_days", 100)
+    harvest_date = sowing_date + timedelta(days=days)
+    days_since_sowing = max((date.today() - sowing_date).days, 0)
+    options = profit_scenarios(days_since_sowing, (crop,)) if crop_info else []
+    weather_forecast = f"{rain_probability(7):.0%} chance of heavy rain in any week the mature crop stays in the field"
+    market_trend = "Prices are stable"
+    advice_key, best_delay, reason = 'default', 0, {}
+    if options:
+        # Compare simulated revenue if harvested at maturity, a week later, and at the best delay.
+        now, week_later = options[0], options[1]
+        best = max(options, key=lambda row: row['expected_revenue'])
+        change = expected_price_change(crop_info, days_since_sowing, DEFAULT_DELAYS[1])
+        market_trend = f"Prices are expected to {'rise' if change >= 0 else 'dip'} {abs(change):.1%} in the week after harvest"
+        gain = best['expected_revenue'] / now['expected_revenue'] - 1
+        loss = 1 - week_later['expected_revenue'] / now['expected_revenue']
+        if best['delay_days'] > 0 and gain >= WAIT_MIN_GAIN:
+            advice_key, best_delay = 'wait', best['delay_days']
+            reason = {'days': best_delay, 'gain': gain, 'price_change': expected_price_change(crop_info, days_since_sowing, best_delay)}
+        elif loss >= HARVEST_NOW_MIN_LOSS:
+            advice_key, reason = 'harvest_now', {'loss': loss, 'rain': rain_probability(DEFAULT_DELAYS[1])}
+    harvest_date += timedelta(days=best_delay)
+    return {"harvest_window": f"{harvest_date.strftime('%d %b')} to {(harvest_date + timedelta(days=10)).strftime('%d %b, %Y')}", "market_outlook": market_trend, "weather_outlook": weather_forecast, "advice": localization.resources(lang)['harvest_advice'][advice_key].format(**reason), "scenarios": options}
@@ -0,0 +1,151 @@
+# benchmarks/bench_app_reruns.py
+# Rerun cost of widget interactions in streamlit_app.py: the whole script (what every
+# interaction cost before the tabs became fragments) vs only the touched tab's fragment.
+#
+# Several simulated sessions, each with its own AppTest and session state, replay the
+# same interactions interleaved on one server thread. Timings are AppTest rerun wall
+# times, so they include the test harness's own element bookkeeping in both modes;
+# AppTest also recompiles the script on every run, which a real server caches.
+#
+# Usage: python benchmarks/bench_app_reruns.py [--sessions 8] [--rounds 10]
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, 'streamlit_app.py')
+
+# A session that has analysed its soil and received a plan, so every tab has content.
+SESSION_STATE = {
+    'soil_analysis_done': True,
+    'soil_analysis_result': {'soil_type': 'Loamy Soil', 'organic_matter_estimate': 'Moderate'},
+    'crop_recommendation_result': {'recommended_crop': 'rice', 'action_plan': {}},
+    'batch_output': None,
+    'village_plan': None,
+    'crop_features': None,
+}
+
+
+def _tab_script(tab):
+    # Becomes the body of a one-tab app: exactly what a fragment rerun of that tab executes.
+    import streamlit_app as app
+    crop_model = app.load_crop_model()
+    T = app.localization.text('en')
+    if tab == 'crop':
+        app.render_crop_tab(crop_model, T, 'en', False)
+    elif tab == 'sms':
+        app.render_sms_tab(crop_model, T, 'en')
+    elif tab == 'harvest':
+        app.render_harvest_tab(T, 'en')
+    elif tab == 'profit':
+        app.render_profit_tab(T)
+
+
+def _edit_crop_n(at, i):
+    next(w for w in at.number_input if w.label == "Nitrogen (N)").set_value(40 + i % 100)
+
+
+def _edit_sms_n(at, i):
+    at.number_input(key='n_sms').set_value(20 + i % 150)
+
+
+def _send_sms(at, i):
+    next(b for b in at.button if 'SMS' in b.label).click()
+
+
+def _change_sowing_date(at, i):
+    at.date_input[0].set_value(date(2025, 1 + i % 12, 1))
+
+
+def _profit_forecast(at, i):
+    next(b for b in at.button if 'Forecast' in b.label).click()
+
+
+INTERACTIONS = [
+    ('crop: edit N', 'crop', _edit_crop_n),
+    ('sms: edit N', 'sms', _edit_sms_n),
+    ('sms: send', 'sms', _send_sms),
+    ('harvest: change date', 'harvest', _change_sowing_date),
+    ('profit: forecast', 'profit', _profit_forecast),
+]
+
+
+def _new_app(mode, tab):
+    if mode == 'full':
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+    else:
+        at = AppTest.from_function(_tab_script, args=(tab,), default_timeout=120)
+    for key, value in SESSION_STATE.items():
+        at.session_state[key] = value
+    return at.run()
+
+
+def _new_session(mode):
+    apps = {}
+    for _, tab, _ in INTERACTIONS:
+        key = 'full' if mode == 'full' else tab
+        if key not in apps:
+            apps[key] = _new_app(mode, tab)
+    return apps
+
+
+def run(mode, sessions, rounds):
+    """
+    Replay every interaction in every session, interleaving the sessions on one thread.
+    A Streamlit server runs all sessions' scripts in one interpreter, so their CPU work
+    is serialized by the GIL the same way; AppTest itself is not safe to run on threads.
+    """
+    timings = {name: [] for name, _, _ in INTERACTIONS}
+    apps = [_new_session(mode) for _ in range(sessions)]
+    start = time.perf_counter()
+    for i in range(rounds):
+        for name, tab, interact in INTERACTIONS:
+            for session in apps:
+                at = session['full' if mode == 'full' else tab]
+                interact(at, i)
+                call_start = time.perf_counter()
+                at.run()
+                timings[name].append((time.perf_counter() - call_start) * 1000)
+                if at.exception:
+                    raise RuntimeError(f"{name}: {at.exception[0].message}")
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-script reruns with per-tab fragment reruns.")
+    parser.add_argument('--sessions', type=int, default=8, help="Simulated sessions sharing the server.")
+    parser.add_argument('--rounds', type=int, default=10, help="Times each session replays every interaction.")
+    args = parser.parse_args()
+    # The sidebar's empty widget labels log a warning with a stack trace on every run.
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    logging.getLogger('streamlit').propagate = False
+
+    _new_app('full', None)  # load the model and warm the caches outside the timings
+    results = {}
+    for mode in ('full', 'fragment'):
+        results[mode] = run(mode, args.sessions, args.rounds)
+
+    print(f"{args.sessions} sessions x {args.rounds} rounds, rerun ms per interaction")
+    print(f"{'interaction':<24}{'full p50':>10}{'full p95':>10}{'frag p50':>10}{'frag p95':>10}{'speedup':>9}")
+    for name, _, _ in INTERACTIONS:
+        full, frag = np.asarray(results['full'][0][name]), np.asarray(results['fragment'][0][name])
+        print(f"{name:<24}{np.percentile(full, 50):>10.1f}{np.percentile(full, 95):>10.1f}"
+              f"{np.percentile(frag, 50):>10.1f}{np.percentile(frag, 95):>10.1f}{np.median(full) / np.median(frag):>8.1f}x")
+    for mode in ('full', 'fragment'):
+        timings, elapsed = results[mode]
+        total = sum(len(t) for t in timings.values())
+        print(f"{mode:<9} {total} interactions in {elapsed:.1f} s ({total / elapsed:.1f}/s for the whole server)")
+
+
+if __name__ == '__main__':
+    main()
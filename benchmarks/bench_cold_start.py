@@ -0,0 +1,88 @@
+# benchmarks/bench_cold_start.py
+# Cold-start cost of streamlit_app.py, each measurement in a fresh Python process:
+#
+#   import     `python -X importtime` total for streamlit_app, and for streamlit alone
+#   render     process start to the end of the first script run (AppTest), i.e. the
+#              first page a visitor sees
+#   first plan process start to the first crop recommendation, Get Plan clicked as soon
+#              as the page is up
+#   plan click how long Get Plan takes when clicked --think seconds after the page is up,
+#              as a visitor filling in the form would
+#
+# Both startup modes are timed: the default, where the model loads and warms up in the
+# background while the page renders, and SMARTAGRO_EAGER_START=1, which loads it first.
+# --app points at another checkout's streamlit_app.py to compare against it.
+#
+# Usage: python benchmarks/bench_cold_start.py [--repeat 5] [--think 3] [--app path/to/streamlit_app.py]
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'streamlit_app.py')
+
+# Runs in the child process; prints "render_s plan_s click_s".
+FIRST_RUN = '''
+import time
+start = time.perf_counter()
+import logging
+logging.disable(logging.WARNING)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+# A visitor whose soil photo is analysed, so the first page already has the Get Plan button.
+at.session_state['soil_analysis_done'] = True
+at.session_state['soil_analysis_result'] = {{'soil_type': 'Loamy Soil', 'organic_matter_estimate': 'Moderate'}}
+at.run()
+render = time.perf_counter() - start
+time.sleep({think})
+click = time.perf_counter()
+at.button[0].click().run()
+assert at.session_state['crop_recommendation_result'], "no recommendation"
+print(render, time.perf_counter() - start, time.perf_counter() - click)
+'''
+
+
+def import_seconds(module, cwd):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd,
+                         capture_output=True, text=True, check=True).stderr
+    for line in reversed(out.splitlines()):
+        match = re.match(rf'import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$', line)
+        if match:
+            return int(match.group(1)) / 1e6
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def first_run_seconds(app, eager, think=0.0):
+    env = dict(os.environ, SMARTAGRO_EAGER_START='1' if eager else '0')
+    out = subprocess.run([sys.executable, '-c', FIRST_RUN.format(app=app, think=think)], cwd=os.path.dirname(app), env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return tuple(map(float, out.split()[-3:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first render of the Streamlit app.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--think', type=float, default=3.0, help="Seconds between the first page and the Get Plan click.")
+    parser.add_argument('--app', default=APP_PATH)
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+    cwd = os.path.dirname(app)
+
+    median = statistics.median
+    streamlit = median(import_seconds('streamlit', cwd) for _ in range(args.repeat))
+    total = median(import_seconds('streamlit_app', cwd) for _ in range(args.repeat))
+    print(f"import streamlit_app: {total:.3f} s (streamlit itself {streamlit:.3f} s, the app's own modules {total - streamlit:.3f} s)")
+
+    print(f"{'startup':>12}{'render s':>10}{'first plan s':>14}{'plan click s':>14}")
+    for eager in (True, False):
+        runs = [first_run_seconds(app, eager) for _ in range(args.repeat)]
+        clicks = [first_run_seconds(app, eager, args.think)[2] for _ in range(args.repeat)]
+        print(f"{'eager' if eager else 'background':>12}{median(r[0] for r in runs):>10.3f}{median(r[1] for r in runs):>14.3f}{median(clicks):>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_crop_engine.py
+# Compares sklearn's RandomForestClassifier.predict with the compiled crop_engine path,
+# and with the compiled path as the bulk tools load it (load_model(keep_estimator=True)),
+# which hands batches of ESTIMATOR_MIN_ROWS rows or more to sklearn.
+#
+# Usage: python benchmarks/bench_crop_engine.py [--rows 100000] [--repeat 200]
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crop_engine import compile_forest, load_model  # noqa: E402
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def time_call(fn, repeat):
+    """Return the median wall time of `fn()` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sklearn vs compiled crop model inference.")
+    parser.add_argument('--rows', type=int, default=100_000, help="Rows in the large batch (sampled with replacement).")
+    parser.add_argument('--repeat', type=int, default=200, help="Repetitions for the single-row timing.")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    model = joblib.load(os.path.join(ROOT, 'crop_model.pkl'))
+    start = time.perf_counter()
+    compiled = compile_forest(model)
+    compile_ms = (time.perf_counter() - start) * 1000
+    bulk = load_model(os.path.join(ROOT, 'crop_model.pkl'), keep_estimator=True)
+
+    X = pd.read_csv(os.path.join(ROOT, 'Crop_recommendation.csv'))[FEATURES].to_numpy()
+    big = X[np.random.default_rng(42).integers(0, len(X), size=args.rows)]
+
+    # Correctness first: the compiled path must agree bit for bit.
+    assert np.array_equal(model.predict_proba(X), compiled.predict_proba(X)), "predict_proba mismatch"
+    assert np.array_equal(model.predict(X), compiled.predict(X)), "predict mismatch"
+    assert np.array_equal(model.predict_proba(big), bulk.predict_proba(big)), "bulk predict_proba mismatch"
+
+    row = [X[0].tolist()]
+    results = [
+        ("single row", *(time_call(lambda m=m: m.predict(row), args.repeat) for m in (model, compiled, bulk))),
+        (f"dataset ({len(X)} rows)", *(time_call(lambda m=m: m.predict(X), 5) for m in (model, compiled, bulk))),
+        (f"batch ({args.rows} rows)", *(time_call(lambda m=m: m.predict(big), 3) for m in (model, compiled, bulk))),
+    ]
+
+    print(f"Compiled {compiled.n_estimators} trees / {len(compiled.feature)} nodes in {compile_ms:.1f} ms")
+    print(f"{'case':<24}{'sklearn ms':>14}{'compiled ms':>14}{'speedup':>10}{'bulk ms':>12}{'speedup':>10}")
+    for name, sk_ms, cf_ms, bulk_ms in results:
+        print(f"{name:<24}{sk_ms:>14.3f}{cf_ms:>14.3f}{sk_ms / cf_ms:>9.1f}x{bulk_ms:>12.3f}{sk_ms / bulk_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_irrigation.py
+# Time irrigation_planner.plan_irrigation for whole villages, and compare it with
+# planning the same fields one at a time (one call per field, as one button press per
+# field in the Water tab would).
+#
+# The weather series is synthetic: a year of monsoon-shaped rainfall and temperatures
+# for ET0 via Hargreaves. --write-sample DIR saves it and a fields table as CSVs, to try
+# the command-line tool with.
+#
+# Usage: python benchmarks/bench_irrigation.py [--fields 1000 10000 100000] [--one-by-one 200]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from advisor import CROP_DATA  # noqa: E402
+from irrigation_planner import hargreaves_et0, plan_irrigation  # noqa: E402
+
+SOIL_TYPES = ['Clay Loam', 'Loamy Soil', 'Sandy Soil']
+
+
+def sample_weather(start='2025-01-01', days=730, latitude=15.0, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq='D')
+    doy = dates.dayofyear.to_numpy()
+    # Rain chance and amounts peak in the June-September monsoon.
+    monsoon = np.exp(-((doy - 200) / 45.0) ** 2)
+    rainy = rng.random(days) < 0.05 + 0.6 * monsoon
+    rainfall = np.where(rainy, rng.gamma(1.2, 6 + 14 * monsoon), 0.0)
+    temp_max = 31 + 5 * np.sin(2 * np.pi * (doy - 60) / 365) - 4 * monsoon + rng.normal(0, 1.2, days)
+    temp_min = temp_max - 9 + 3 * monsoon + rng.normal(0, 1.0, days)
+    return pd.DataFrame({'date': dates, 'rainfall': rainfall.round(1), 'temp_min': temp_min.round(1), 'temp_max': temp_max.round(1),
+                         'et0': hargreaves_et0(dates, temp_min, temp_max, latitude).round(2)})
+
+
+def sample_fields(n, start='2025-01-01', sowing_window=240, seed=0):
+    rng = np.random.default_rng(seed)
+    crops = np.array(list(CROP_DATA))
+    return pd.DataFrame({
+        'field_id': [f"F{i:06d}" for i in range(n)],
+        'soil_type': rng.choice(SOIL_TYPES, n),
+        'crop': rng.choice(crops, n),
+        'sowing_date': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, sowing_window, n), unit='D'),
+        'area_acres': rng.uniform(0.5, 5.0, n).round(2),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark season-long irrigation planning for many fields.")
+    parser.add_argument('--fields', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--one-by-one', type=int, default=200, help="Fields to plan one call at a time for comparison.")
+    parser.add_argument('--write-sample', metavar='DIR', help="Write sample weather.csv and fields.csv (1000 fields) here and exit.")
+    args = parser.parse_args()
+
+    weather = sample_weather()
+    if args.write_sample:
+        os.makedirs(args.write_sample, exist_ok=True)
+        weather.drop(columns='et0').to_csv(os.path.join(args.write_sample, 'weather.csv'), index=False)
+        sample_fields(1000).to_csv(os.path.join(args.write_sample, 'fields.csv'), index=False)
+        print(f"Wrote weather.csv and fields.csv to {args.write_sample}")
+        return
+    weather = weather[['date', 'rainfall', 'et0']]
+    plan_irrigation(weather, sample_fields(100))  # warm up imports and allocators
+
+    print(f"{'fields':>8}{'seconds':>10}{'fields/s':>12}{'irrigations':>13}{'water m3':>14}")
+    for n in args.fields:
+        fields = sample_fields(n)
+        start = time.perf_counter()
+        plan = plan_irrigation(weather, fields)
+        elapsed = time.perf_counter() - start
+        print(f"{n:>8}{elapsed:>10.2f}{n / elapsed:>12,.0f}{len(plan['schedule']):>13,}{plan['summary']['water_m3'].sum():>14,.0f}")
+
+    if args.one_by_one:
+        fields = sample_fields(args.one_by_one)
+        start = time.perf_counter()
+        for i in range(len(fields)):
+            plan_irrigation(weather, fields.iloc[i:i + 1])
+        one_by_one = time.perf_counter() - start
+        start = time.perf_counter()
+        plan_irrigation(weather, fields)
+        together = time.perf_counter() - start
+        print(f"{args.one_by_one} fields one call each: {one_by_one:.2f} s, in one call: {together:.3f} s ({one_by_one / together:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
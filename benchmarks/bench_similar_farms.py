@@ -0,0 +1,90 @@
+# benchmarks/bench_similar_farms.py
+# Build, load and query cost of the similar-farms KD-tree as the dataset grows, against
+# the linear scan it replaces.
+#
+# Datasets larger than Crop_recommendation.csv are resampled from it with a little noise
+# on every feature, so they keep its clusters. Queries are jittered real rows.
+#
+# Usage: python benchmarks/bench_similar_farms.py [--sizes 2200 100000 1000000 4000000] [-k 5]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from advisor import FEATURE_COLUMNS  # noqa: E402
+from similar_farms import DATASET_PATH, SimilarFarmsIndex  # noqa: E402
+
+
+def grow_dataset(df, n, seed=0):
+    if n <= len(df):
+        return df[FEATURE_COLUMNS].to_numpy()[:n], df['label'].to_numpy()[:n]
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(df), n)
+    X = df[FEATURE_COLUMNS].to_numpy()[rows]
+    X = X + rng.normal(0, 0.02, X.shape) * X.std(axis=0)
+    return X, df['label'].to_numpy()[rows]
+
+
+def linear_scan(X_scaled, q, k):
+    d = ((X_scaled - q) ** 2).sum(axis=1)
+    nearest = np.argpartition(d, k)[:k]
+    return nearest[np.argsort(d[nearest])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similar-farms index against a linear scan.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2200, 100_000, 1_000_000, 4_000_000])
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=10_000)
+    args = parser.parse_args()
+
+    df = pd.read_csv(DATASET_PATH)
+    rng = np.random.default_rng(1)
+    print(f"{'rows':>10}{'build s':>9}{'file MB':>9}{'load s':>8}{'p50 us':>9}{'p99 us':>9}{'batch us/q':>12}{'scan us':>10}")
+    for n in args.sizes:
+        X, y = grow_dataset(df, n)
+        start = time.perf_counter()
+        index = SimilarFarmsIndex.build(X, y)
+        build = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'similar_farms.index')
+            index.save(path)
+            size_mb = os.path.getsize(path) / 1e6
+            start = time.perf_counter()
+            index = SimilarFarmsIndex.load(path)
+            load = time.perf_counter() - start
+
+        queries = X[rng.integers(0, n, args.queries)] * rng.normal(1, 0.05, (args.queries, X.shape[1]))
+        timings = []
+        for q in queries:
+            call = time.perf_counter()
+            index.query_batch(q, args.k)
+            timings.append((time.perf_counter() - call) * 1e6)
+
+        batch = X[rng.integers(0, n, args.batch)] * rng.normal(1, 0.05, (args.batch, X.shape[1]))
+        start = time.perf_counter()
+        index.query_batch(batch, args.k)
+        per_query = (time.perf_counter() - start) / args.batch * 1e6
+
+        scaled, scans = index.tree.data, min(50, args.queries)
+        start = time.perf_counter()
+        for q in queries[:scans]:
+            linear_scan(scaled, (q - index.mean) / index.scale, args.k)
+        scan = (time.perf_counter() - start) / scans * 1e6
+
+        print(f"{n:>10,}{build:>9.2f}{size_mb:>9.1f}{load:>8.2f}{np.percentile(timings, 50):>9.1f}{np.percentile(timings, 99):>9.1f}"
+              f"{per_query:>12.2f}{scan:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_sms_campaign.py
+# Throughput and peak memory of sms_campaign for growing rosters, and the one-farmer-at-a-
+# time path it replaces (the SMS tab's model call and sms_message for every row).
+#
+# Rosters are synthetic: random mobile numbers, a mix of en/kn/hi and keypad soil tests
+# (whole N/P/K, pH to 0.1). Each roster size runs in a fresh process so its peak RSS is
+# its own; with/without the SMS table shows what the table lookup saves over the model.
+#
+# Usage: python benchmarks/bench_sms_campaign.py [--rows 100000 1000000] [--one-by-one 2000] [--write-sample roster.csv]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import advisor  # noqa: E402
+from crop_engine import MODEL_PATH, load_model  # noqa: E402
+from recommendation_cache import DEFAULT_TABLE_PATH  # noqa: E402
+
+# Runs in the child process; prints "seconds rows_per_s peak_rss_mb".
+CAMPAIGN_RUN = '''
+import resource, sys
+sys.path.insert(0, {root!r})
+from crop_engine import load_model
+from recommendation_cache import open_sms_table
+from sms_campaign import run_campaign
+crop_model = load_model({model!r}, keep_estimator=True)
+table = open_sms_table({table!r}, {model!r}) if {table!r} else None
+stats = run_campaign(crop_model, {roster!r}, {out_dir!r}, table=table)
+print(stats['seconds'], stats['rows_per_s'], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+'''
+
+
+def sample_roster(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'phone': rng.integers(6_000_000_000, 10_000_000_000, n).astype(str),
+        'lang': rng.choice(['en', 'kn', 'hi'], n, p=[0.3, 0.45, 0.25]),
+        'N': rng.integers(0, 141, n), 'P': rng.integers(5, 146, n), 'K': rng.integers(5, 206, n),
+        'ph': rng.uniform(4.0, 9.0, n).round(1),
+    })
+
+
+def run_campaign_child(roster, out_dir, table):
+    out = subprocess.run([sys.executable, '-c', CAMPAIGN_RUN.format(root=ROOT, model=MODEL_PATH, table=table, roster=roster, out_dir=out_dir)],
+                         capture_output=True, text=True, check=True).stdout
+    return tuple(map(float, out.split()[-3:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk SMS campaign generation.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--one-by-one', type=int, default=2000, help="Rows to message one call at a time for comparison.")
+    parser.add_argument('--write-sample', metavar='PATH', help="Write a 10,000-row sample roster here and exit.")
+    args = parser.parse_args()
+
+    if args.write_sample:
+        sample_roster(10_000).to_csv(args.write_sample, index=False)
+        print(f"Wrote {args.write_sample}")
+        return
+
+    print(f"{'rows':>10}{'table':>7}{'seconds':>9}{'rows/s':>10}{'peak MB':>9}{'output MB':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            roster = os.path.join(tmp, f'roster_{n}.csv')
+            sample_roster(n).to_csv(roster, index=False)
+            for table in ([DEFAULT_TABLE_PATH, ''] if os.path.exists(DEFAULT_TABLE_PATH) else ['']):
+                out_dir = os.path.join(tmp, f'out_{n}')
+                seconds, rate, peak = run_campaign_child(roster, out_dir, table)
+                size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir)) / 1e6
+                print(f"{n:>10,}{'yes' if table else 'no':>7}{seconds:>9.1f}{rate:>10,.0f}{peak:>9.0f}{size:>11.0f}")
+
+    if args.one_by_one:
+        crop_model = load_model(MODEL_PATH)
+        roster = sample_roster(args.one_by_one)
+        start = time.perf_counter()
+        for row in roster.itertuples(index=False):
+            features = advisor.sms_features(row.N, row.P, row.K, row.ph)
+            crop = crop_model.predict([features])[0]
+            advisor.sms_message(row.phone, crop, row.lang, markdown=False)
+        rate = args.one_by_one / (time.perf_counter() - start)
+        print(f"one farmer at a time: {rate:,.0f} rows/s ({1_000_000 / rate / 60:.0f} min for a million rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_soil_image.py
+# Peak memory and time of analyze_soil_image on large synthetic soil photos,
+# comparing the original full-array implementation with the draft/histogram fast path.
+#
+# Usage: python benchmarks/bench_soil_image.py [--megapixels 2 12 48] [--format JPEG PNG]
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def legacy_analyze_soil_image(image_file):
+    """The original implementation: decode at full size and average a full RGB array."""
+    with Image.open(image_file) as img:
+        avg_color = np.array(img.convert('RGB')).mean(axis=(0, 1))
+        brightness = sum(avg_color) / 3
+        if brightness < 80: return {"soil_type": "Clay Loam", "organic_matter_estimate": "High"}
+        elif brightness < 140: return {"soil_type": "Loamy Soil", "organic_matter_estimate": "Moderate"}
+        else: return {"soil_type": "Sandy Soil", "organic_matter_estimate": "Low"}
+
+
+def make_soil_photo(megapixels, fmt, seed=0):
+    """Encode a brown, mottled 4:3 photo of roughly `megapixels` MP."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    coarse = rng.normal([110, 80, 55], 25, size=(height // 32 + 1, width // 32 + 1, 3)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(coarse).resize((width, height), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=90) if fmt == 'JPEG' else img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); spawned children inherit the parent's otherwise."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(impl, data, queue):
+    # Runs in a fresh process so the peak RSS reflects only this one call.
+    import advisor
+    fn = legacy_analyze_soil_image if impl == 'legacy' else advisor.analyze_soil_image
+    _reset_peak_rss()
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    result = fn(io.BytesIO(data))
+    elapsed = time.perf_counter() - start
+    cached_start = time.perf_counter()
+    fn(io.BytesIO(data))
+    cached = time.perf_counter() - cached_start
+    queue.put((elapsed * 1000, cached * 1000, _peak_rss_mb() - baseline, result['soil_type']))
+
+
+def measure(impl, data):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(impl, data, queue))
+    proc.start()
+    out = queue.get()
+    proc.join()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark soil image analysis on large synthetic photos.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[2, 12, 48])
+    parser.add_argument('--format', nargs='+', default=['JPEG', 'PNG'])
+    args = parser.parse_args()
+
+    print(f"{'image':<14}{'impl':<8}{'first ms':>10}{'repeat ms':>11}{'peak MB':>10}  soil type")
+    for fmt in args.format:
+        for mp in args.megapixels:
+            data = make_soil_photo(mp, fmt)
+            name = f"{mp:g}MP {fmt}"
+            for impl in ('legacy', 'fast'):
+                first_ms, repeat_ms, peak_mb, soil = measure(impl, data)
+                print(f"{name:<14}{impl:<8}{first_ms:>10.1f}{repeat_ms:>11.2f}{peak_mb:>10.1f}  {soil}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+# benchmarks/bench_suite.py
+# Latency and peak-memory suite for the model load path and every advisor function.
+#
+# Each case runs in its own spawned process, so peak RSS covers only that case and
+# "cold" loads really start from a fresh interpreter. Results (p50/p95/p99 per call,
+# per-item time for batched cases, the process's peak RSS during the timed calls and
+# how far it grew over the post-setup baseline) are saved as JSON; pass --compare to
+# diff against the JSON of an earlier commit.
+#
+# predict_disease runs against a small local stub network by default, which times
+# the decode/preprocess/batching pipeline without TensorFlow or downloaded weights.
+# Pass --disease-weights path/to/mobilenet_v2.h5 to time the real network instead.
+#
+# Usage: python benchmarks/bench_suite.py [--quick] [--only soil] [--compare benchmarks/results/abc1234.json]
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_soil_image import _peak_rss_mb, _reset_peak_rss, make_soil_photo  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DATASET_PATH = os.path.join(ROOT, 'Crop_recommendation.csv')
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# name -> setup(batch, opts) returning the zero-argument callable to time.
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _soil_rows(n, seed=0):
+    import pandas as pd
+    df = pd.read_csv(DATASET_PATH)
+    return df[FEATURES].sample(n, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def _cycle(items, fn):
+    """Callable that applies `fn` to the next item on each call, so repeats don't hit one input."""
+    state = {'i': 0}
+    def call():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return fn(item)
+    return call
+
+
+@case('joblib_load')
+def _joblib_load(batch, opts):
+    import joblib
+    return lambda: joblib.load(opts['model'])
+
+
+@case('load_crop_model')
+def _load_crop_model(batch, opts):
+    # The uncached body of streamlit_app.load_crop_model; st.cache_resource adds a dict lookup.
+    from crop_engine import load_model
+    return lambda: load_model(opts['model'])
+
+
+@case('predict_crop_and_plan')
+def _predict_crop_and_plan(batch, opts):
+    import advisor
+    from crop_engine import load_model
+    crop_model = load_model(opts['model'])
+    rows = _soil_rows(max(batch, 256))
+    if batch == 1:
+        return _cycle(rows.to_numpy().tolist(), lambda data: advisor.predict_crop_and_plan(crop_model, data, 'en'))
+    # Batched inputs go through the kiosk path, which scores a whole frame in one predict call.
+    import kiosk_batch
+    frame = rows.iloc[:batch]
+    return lambda: kiosk_batch.recommend_chunk(crop_model, frame)
+
+
+def _soil_case(megapixels):
+    def setup(batch, opts):
+        import advisor
+        photos = [make_soil_photo(megapixels, 'JPEG', seed=i) for i in range(min(batch, 8) if batch > 1 else 4)]
+        def analyze(data):
+            advisor._soil_cache.clear()  # time the decode, not the content-hash cache
+            return advisor.analyze_soil_image(io.BytesIO(data))
+        if batch == 1:
+            return _cycle(photos, analyze)
+        return lambda: [analyze(photos[i % len(photos)]) for i in range(batch)]
+    return setup
+
+
+for _mp in (0.3, 2, 12):
+    case(f'analyze_soil_image[{_mp:g}MP]')(_soil_case(_mp))
+
+
+@case('analyze_soil_image[cached]')
+def _soil_cached(batch, opts):
+    import advisor
+    data = make_soil_photo(2, 'JPEG')
+    return lambda: [advisor.analyze_soil_image(io.BytesIO(data)) for _ in range(batch)]
+
+
+@case('diagnose_threat')
+def _diagnose_threat(batch, opts):
+    import advisor
+    langs = ['en', 'kn', 'hi']
+    return lambda: [advisor.diagnose_threat(langs[i % 3]) for i in range(batch)]
+
+
+@case('get_watering_advice')
+def _get_watering_advice(batch, opts):
+    import advisor
+    soils = ['Clay Loam', 'Loamy Soil', 'Sandy Soil']
+    return lambda: [advisor.get_watering_advice(soils[i % 3], 'en') for i in range(batch)]
+
+
+@case('get_harvest_advice')
+def _get_harvest_advice(batch, opts):
+    import advisor
+    crops = list(advisor.CROP_DATA) + ['rice', 'maize']
+    sowing = date(2025, 6, 1)
+    return lambda: [advisor.get_harvest_advice(crops[i % len(crops)], sowing, 'en') for i in range(batch)]
+
+
+
+@case('profit_scenarios')
+def _profit_scenarios(batch, opts):
+    # Uncached: every call simulates all crops x harvest delays x 20k seasons.
+    import advisor
+    from scenarios import scenario_table
+    return lambda: [scenario_table(advisor.CROP_DATA, seed=i) for i in range(batch)]
+
+class StubLeafModel:
+    """
+    Stand-in for MobileNetV2 with the same call signature and a 1000-class softmax
+    output: global-average-pooled RGB through a fixed random projection.
+    """
+
+    def __init__(self, n_classes=1000, seed=0):
+        self.weights = np.random.default_rng(seed).normal(size=(3, n_classes)).astype(np.float32)
+
+    def __call__(self, batch, training=False):
+        logits = np.asarray(batch).mean(axis=(1, 2)) @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _stub_class_index(n_classes=1000):
+    # A few labels contain CLASS_MAPPING keywords so both result branches get exercised.
+    keywords = ['bell_pepper', 'scab', 'black_rot', 'leaf_blight', 'spot_disease', 'strawberry']
+    index = {str(i): [f"n{i:08d}", keywords[i % len(keywords)] if i % 10 == 0 else f"class_{i}"] for i in range(n_classes)}
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f)
+    return path
+
+
+def _leaf_photo(seed, size=(640, 480)):
+    rng = np.random.default_rng(seed)
+    pixels = rng.normal([70, 140, 60], 30, size=(size[1], size[0], 3)).clip(0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format='JPEG', quality=90)
+    return buf.getvalue()
+
+
+@case('predict_disease')
+def _predict_disease(batch, opts):
+    import disease_predictor
+    if opts['disease_weights']:
+        disease_predictor.get_model(opts['disease_weights'])
+    else:
+        disease_predictor._model = StubLeafModel()
+        disease_predictor.CLASS_INDEX_PATH = _stub_class_index()
+    photos = [_leaf_photo(i) for i in range(min(batch, 64) if batch > 1 else 8)]
+    if batch == 1:
+        return _cycle(photos, disease_predictor.predict_disease)
+    return lambda: list(disease_predictor.predict_diseases(photos[i % len(photos)] for i in range(batch)))
+
+
+def _run_case(name, batch, repeat, cold, opts, queue):
+    # Runs in a fresh process; reports per-call timings and this case's own peak RSS.
+    try:
+        fn = CASES[name](batch, opts)
+        if not cold:
+            fn()  # warm imports, lazy models and allocator pools
+        _reset_peak_rss()
+        baseline = _peak_rss_mb()
+        timings = []
+        for _ in range(1 if cold else repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        peak = _peak_rss_mb()
+        queue.put((timings, peak, peak - baseline, None))
+    except Exception as e:
+        queue.put(([], 0.0, 0.0, f"{type(e).__name__}: {e}"))
+
+
+def run_case(name, batch, repeat, cold, opts):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(name, batch, repeat, cold, opts, queue))
+    proc.start()
+    out = queue.get()
+    proc.join()
+    return out
+
+
+def summarize(name, batch, mode, timings, peak_mb, growth_mb):
+    t = np.asarray(timings)
+    return {
+        'case': name, 'batch': batch, 'mode': mode, 'samples': len(t),
+        'p50_ms': float(np.percentile(t, 50)), 'p95_ms': float(np.percentile(t, 95)),
+        'p99_ms': float(np.percentile(t, 99)), 'mean_ms': float(t.mean()),
+        'per_item_ms': float(np.percentile(t, 50) / batch), 'peak_rss_mb': float(peak_mb),
+        'rss_growth_mb': float(growth_mb),
+    }
+
+
+def plan(args):
+    """(case, batch, mode) triples to run."""
+    runs = [('joblib_load', 1, 'cold'), ('joblib_load', 1, 'warm'), ('load_crop_model', 1, 'cold'), ('load_crop_model', 1, 'warm')]
+    for name in CASES:
+        if name in ('joblib_load', 'load_crop_model'):
+            continue
+        runs.append((name, 1, 'warm'))
+        if name not in ('analyze_soil_image[12MP]', 'profit_scenarios'):
+            runs.append((name, args.batch_size, 'warm'))
+    if args.only:
+        runs = [r for r in runs if any(pattern in r[0] for pattern in args.only)]
+    return runs
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r['case'], r['batch'], r['mode']): r for r in json.load(f)['results']}
+    print(f"\nAgainst {baseline_path} (p50, flagged when more than {threshold:.0%} slower):")
+    for r in results:
+        old = baseline.get((r['case'], r['batch'], r['mode']))
+        if old is None or not old['p50_ms']:
+            continue
+        ratio = r['p50_ms'] / old['p50_ms']
+        flag = '  REGRESSION' if ratio > 1 + threshold else ''
+        print(f"  {r['case']:<30}{r['batch']:>6} {r['mode']:<5}{old['p50_ms']:>10.3f} -> {r['p50_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model load path and every advisor function.")
+    parser.add_argument('--model', default=os.path.join(ROOT, 'crop_model.pkl'))
+    parser.add_argument('--batch-size', type=int, default=256, help="Inputs per call for the batched cases.")
+    parser.add_argument('--repeat', type=int, default=200, help="Timed calls per warm case.")
+    parser.add_argument('--cold-runs', type=int, default=5, help="Fresh processes per cold case.")
+    parser.add_argument('--quick', action='store_true', help="Fewer repeats, for a fast sanity check.")
+    parser.add_argument('--only', nargs='+', help="Run only cases whose name contains one of these strings.")
+    parser.add_argument('--disease-weights', help="Local MobileNetV2 weights; default is the stub model.")
+    parser.add_argument('--output', help="Result JSON path (default benchmarks/results/<commit>.json).")
+    parser.add_argument('--compare', help="Earlier result JSON to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Slowdown flagged as a regression by --compare.")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.cold_runs = 30, 2
+
+    opts = {'model': args.model, 'disease_weights': args.disease_weights}
+    results = []
+    print(f"{'case':<30}{'batch':>6} {'mode':<5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'item ms':>10}{'peak MB':>9}{'grew MB':>9}")
+    for name, batch, mode in plan(args):
+        if mode == 'cold':
+            runs = [run_case(name, batch, 1, True, opts) for _ in range(args.cold_runs)]
+            timings = [t for r in runs for t in r[0]]
+            peak_mb, growth_mb = max(r[1] for r in runs), max(r[2] for r in runs)
+            error = next((r[3] for r in runs if r[3]), None)
+        else:
+            # Heavy batched cases get fewer repeats so the suite stays a few minutes long.
+            repeat = args.repeat if batch == 1 else max(5, args.repeat // 20)
+            timings, peak_mb, growth_mb, error = run_case(name, batch, repeat, False, opts)
+        if error:
+            print(f"{name:<30}{batch:>6} {mode:<5}  failed: {error}")
+            continue
+        r = summarize(name, batch, mode, timings, peak_mb, growth_mb)
+        results.append(r)
+        print(f"{name:<30}{batch:>6} {mode:<5}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['per_item_ms']:>10.4f}{r['peak_rss_mb']:>9.1f}{r['rss_growth_mb']:>9.1f}")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        'commit': commit, 'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+        'disease_model': args.disease_weights or 'stub', 'repeat': args.repeat, 'batch_size': args.batch_size,
+    }
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
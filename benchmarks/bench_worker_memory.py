@@ -0,0 +1,96 @@
+# benchmarks/bench_worker_memory.py
+# Per-worker and total memory of the SMS service under prefork.py as the worker count grows.
+#
+# Modes:
+#   independent   every worker unpickles crop_model.pkl after forking (no sharing)
+#   prefork       the parent unpickles it once, workers share the pages copy-on-write
+#   prefork-mmap  the parent memory-maps the node-array export (crop_engine.py export)
+#
+# Each run warms every worker with real /recommend traffic before reading
+# /proc/<pid>/smaps_rollup. PSS summed over workers is the memory they really cost.
+#
+# Usage: python benchmarks/bench_worker_memory.py [--workers 1 2 4 8] [--requests 4000]
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crop_engine import COMPILED_MODEL_PATH, MODEL_PATH, export_model  # noqa: E402
+from prefork import child_pids, memory_usage  # noqa: E402
+from sms_loadgen import run_load  # noqa: E402
+
+MODES = {
+    'independent': ['--model', MODEL_PATH, '--load-in-workers'],
+    'prefork': ['--model', MODEL_PATH],
+    'prefork-mmap': ['--model', COMPILED_MODEL_PATH],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port, workers, parent, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).read()
+            if len(child_pids(parent)) >= workers:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("prefork.py did not become ready")
+
+
+def measure(mode, workers, requests):
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(ROOT, 'prefork.py'), '--workers', str(workers), '--port', str(port)] + MODES[mode]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, workers, proc.pid)
+        asyncio.run(run_load('127.0.0.1', port, concurrency=8 * workers, requests=requests))
+        time.sleep(0.5)
+        usages = [memory_usage(pid) for pid in child_pids(proc.pid)]
+        parent = memory_usage(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    n = len(usages)
+    return {
+        'rss_mb': sum(u['rss_mb'] for u in usages) / n,
+        'pss_mb': sum(u['pss_mb'] for u in usages) / n,
+        'uss_mb': sum(u['uss_mb'] for u in usages) / n,
+        'total_pss_mb': sum(u['pss_mb'] for u in usages) + parent['pss_mb'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-worker memory of the preforked SMS service.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--requests', type=int, default=4000, help="Warm-up requests per run.")
+    args = parser.parse_args()
+
+    if 'prefork-mmap' in args.modes and not os.path.isdir(COMPILED_MODEL_PATH):
+        export_model(MODEL_PATH, COMPILED_MODEL_PATH)
+
+    print(f"{'mode':<14}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>12}   (MB)")
+    for mode in args.modes:
+        for workers in args.workers:
+            r = measure(mode, workers, args.requests)
+            print(f"{mode:<14}{workers:>8}{r['rss_mb']:>12.1f}{r['pss_mb']:>12.1f}{r['uss_mb']:>12.1f}{r['total_pss_mb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
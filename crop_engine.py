@@ -0,0 +1,456 @@
+# crop_engine.py
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger("smartagro.crop_engine")
+
+# The app, the SMS service and the batch tools all read the model from the repository root.
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_model.pkl')
+# The same model exported as raw .npy node arrays that worker processes memory-map and share.
+COMPILED_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_model.forest')
+
+# Rows scored per traversal pass. Small enough that the per-chunk node arrays
+# stay in cache, large enough to amortise numpy's per-call overhead.
+DEFAULT_CHUNK_SIZE = 1024
+# The traversal drops (tree, row) pairs that reached a leaf every COMPACT_EVERY levels,
+# once fewer than COMPACT_BELOW of them are still descending.
+COMPACT_EVERY = 2
+COMPACT_BELOW = 0.7
+# From about this many rows, scikit-learn's compiled tree code beats the NumPy traversal;
+# a CompiledForest that still holds its estimator (load_model(keep_estimator=True)) hands
+# such batches to it. Results are identical either way.
+ESTIMATOR_MIN_ROWS = 1000
+
+
+def _float32_floor(thresholds):
+    """
+    Largest float32 <= each float64 threshold.
+
+    sklearn casts inputs to float32 and compares them against float64 thresholds,
+    so `x <= t` and `x <= _float32_floor(t)` agree for every float32 x.
+    """
+    floor = thresholds.astype(np.float32)
+    over = floor.astype(np.float64) > thresholds
+    floor[over] = np.nextafter(floor[over], np.float32(-np.inf))
+    return floor
+
+
+class CompiledForest:
+    """
+    A trained RandomForestClassifier flattened into contiguous NumPy node arrays.
+
+    All trees are concatenated into one node table and scored with a vectorized,
+    level-by-level traversal that drops (tree, row) pairs as they reach a leaf.
+    Results match sklearn's predict / predict_proba exactly.
+    """
+
+    def __init__(self, feature, threshold, children, is_leaf, value, roots, max_depth,
+                 classes, n_features_in, feature_names_in=None, estimator=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.is_leaf = is_leaf
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features_in)
+        self.feature_names_in_ = feature_names_in
+        self.estimator = estimator
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_estimator(cls, model):
+        """Build the node arrays from a fitted sklearn forest (or a single decision tree) classifier."""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be compiled.")
+
+        features, thresholds, children, leaves, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        estimators = [model] if hasattr(model, 'tree_') else model.estimators_
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            node_ids = np.arange(offset, offset + n, dtype=np.intp)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            # children[2 * node] is the left child, children[2 * node + 1] the right one.
+            # Leaves point back at themselves.
+            pair = np.empty((n, 2), dtype=np.intp)
+            pair[:, 0] = np.where(is_leaf, node_ids, tree.children_left + offset)
+            pair[:, 1] = np.where(is_leaf, node_ids, tree.children_right + offset)
+            children.append(pair.ravel())
+            leaves.append(is_leaf)
+
+            # Same normalisation as DecisionTreeClassifier.predict_proba.
+            leaf_value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = leaf_value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(leaf_value / normalizer)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=_float32_floor(np.concatenate(thresholds).astype(np.float64)),
+            children=np.concatenate(children),
+            is_leaf=np.concatenate(leaves),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+            n_features_in=model.n_features_in_,
+            feature_names_in=getattr(model, 'feature_names_in_', None),
+        )
+
+    _ARRAYS = ('feature', 'threshold', 'children', 'is_leaf', 'value', 'roots')
+
+    def save(self, directory, source_digest=None):
+        """
+        Write the node arrays as .npy files plus a small meta.json into `directory`,
+        replacing any previous export only once the new one is complete.
+        """
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in self._ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            'max_depth': self.max_depth,
+            'classes': [str(c) for c in self.classes_],
+            'n_features_in': self.n_features_in_,
+            'feature_names_in': None if self.feature_names_in_ is None else [str(f) for f in self.feature_names_in_],
+            'source_digest': source_digest,
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        old_dir = f"{directory}.old"
+        if os.path.exists(directory):
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Open an export written by save(). With mmap_mode='r' the node arrays are read-only
+        views of the files, so every process that opens them shares the same page-cache pages.
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls._ARRAYS}
+        # Plain ndarray views of the same mapping: indexing np.memmap goes through a slow
+        # Python-level __getitem__, which costs about 15% of predict time.
+        arrays = {name: array.view(np.ndarray) for name, array in arrays.items()}
+        names = meta['feature_names_in']
+        return cls(
+            **arrays,
+            max_depth=meta['max_depth'],
+            classes=np.asarray(meta['classes'], dtype=object),
+            n_features_in=meta['n_features_in'],
+            feature_names_in=None if names is None else np.asarray(names, dtype=object),
+        )
+
+    def _validate(self, X):
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n_rows, {self.n_features_in_}), got {X.shape}.")
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """Return the global leaf index reached in every tree, shape (n_trees, n_rows)."""
+        return self._apply(self._validate(X))
+
+    def _apply(self, X):
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, self.n_estimators)
+        leaves = slots = None
+        for depth in range(1, self.max_depth + 1):
+            # Leaves point back at themselves, so (tree, row) pairs that reached one just stay put.
+            go_right = flat_X[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+            # Dropping finished pairs costs a mask and three copies, so only do it every
+            # COMPACT_EVERY levels and once they are a sizeable share of the pairs.
+            if depth % COMPACT_EVERY == 0:
+                active = ~self.is_leaf[nodes]
+                if np.count_nonzero(active) < COMPACT_BELOW * active.size:
+                    if slots is None:
+                        leaves, slots = nodes.copy(), np.flatnonzero(active)
+                    else:
+                        leaves[slots] = nodes
+                        slots = slots[active]
+                    nodes, row_offsets = nodes[active], row_offsets[active]
+        if slots is None:
+            leaves = nodes
+        else:
+            leaves[slots] = nodes
+        return leaves.reshape(self.n_estimators, n_rows)
+
+    def predict_proba(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Class probabilities averaged over all trees, shape (n_rows, n_classes)."""
+        X = self._validate(X)
+        if self.estimator is not None and X.shape[0] >= ESTIMATOR_MIN_ROWS:
+            return self._estimator_proba(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            stop = start + chunk_size
+            leaves = self._apply(X[start:stop])
+            # Accumulate tree by tree, in order, so float sums match sklearn bit for bit.
+            for tree_leaves in leaves:
+                proba[start:stop] += self.value[tree_leaves]
+        proba /= self.n_estimators
+        return proba
+
+    def _estimator_proba(self, X):
+        if self.feature_names_in_ is not None:
+            # Named columns, as the estimator was fitted with, so it doesn't warn about them.
+            import pandas as pd
+            X = pd.DataFrame(X, columns=self.feature_names_in_, copy=False)
+        return self.estimator.predict_proba(X)
+
+    def predict(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Predicted crop label for every row."""
+        proba = self.predict_proba(X, chunk_size=chunk_size)
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+
+def is_compilable(model):
+    """True for fitted single-output tree classifiers: random forests, extra-trees and single trees."""
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    compilable = (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier)
+    return isinstance(model, compilable) and getattr(model, 'n_outputs_', 1) == 1
+
+
+def compile_forest(model):
+    """
+    Compile a fitted tree classifier. Models that are already compiled, and compact
+    non-tree models (which are served through their own predict), pass through unchanged.
+    """
+    if isinstance(model, CompiledForest) or not is_compilable(model):
+        return model
+    return CompiledForest.from_estimator(model)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def model_digest(path):
+    """
+    Identity of the model at `path`. An exported node-array directory reports the digest
+    of the pickle it was exported from, so artifacts keyed on that model stay valid.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            digest = json.load(f).get('source_digest')
+        if digest:
+            return digest
+        return file_digest(os.path.join(path, 'value.npy'))
+    return file_digest(path)
+
+
+def export_model(model_path=MODEL_PATH, out_dir=COMPILED_MODEL_PATH):
+    """Compile the pickled forest at `model_path` and save its node arrays to `out_dir`."""
+    import joblib
+    model = compile_forest(joblib.load(model_path))
+    if not isinstance(model, CompiledForest):
+        raise ValueError("Only tree-based crop models can be exported as node arrays.")
+    model.save(out_dir, source_digest=file_digest(model_path))
+    return model
+
+
+def _current_export(path):
+    """The node-array directory next to the pickle at `path` (x.pkl -> x.forest), if it was exported from this pickle."""
+    exported = os.path.splitext(path)[0] + '.forest'
+    if os.path.isdir(exported) and model_digest(exported) == file_digest(path):
+        return exported
+    return None
+
+
+def load_model(path=MODEL_PATH, mmap_mode='r', keep_estimator=False):
+    """
+    Load the crop model at `path` ready for fast inference: a pickle is unpickled and
+    compiled; a directory written by export_model is memory-mapped (`mmap_mode`).
+    A pickle with an up-to-date export next to it is served from the export, which
+    skips importing scikit-learn (most of the cost of a cold start).
+    Bulk tools pass keep_estimator=True: the pickle is always unpickled and the compiled
+    forest keeps the estimator for batches of ESTIMATOR_MIN_ROWS rows or more.
+    """
+    start = time.perf_counter()
+    if not os.path.isdir(path) and not keep_estimator:
+        path = _current_export(path) or path
+    if os.path.isdir(path):
+        model = CompiledForest.load(path, mmap_mode=mmap_mode)
+    else:
+        # Imported here: joblib takes longer to import than the rest of this module.
+        import joblib
+        estimator = joblib.load(path)
+        model = compile_forest(estimator)
+        if keep_estimator and isinstance(model, CompiledForest) and model is not estimator:
+            model.estimator = estimator
+    metrics.model_loaded('crop_model', time.perf_counter() - start)
+    return model
+
+
+def warm_up(model):
+    """Run one prediction so the first real request doesn't pay for paging in the model and one-time setup."""
+    model.predict(np.zeros((1, model.n_features_in_)))
+    return model
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ReloadingModel:
+    """
+    A crop model that follows its file on disk.
+
+    The file is re-checked at most every `check_interval` seconds. A changed file is
+    loaded on a background thread and swapped in once it is ready, so callers keep
+    predicting with the previous model in the meantime and never wait on a reload.
+
+    With `background=True` the first load (and a warm-up prediction) also runs on a
+    background thread, so a UI can render while it happens; only callers that need the
+    model before it is ready wait for it. A missing file still raises here.
+    `keep_estimator` is passed to every load_model call (see there), for bulk scoring.
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=2.0, model=None, background=False, keep_estimator=False):
+        self.path = path
+        self.check_interval = check_interval
+        self.keep_estimator = keep_estimator
+        self.reloads = 0
+        self.version = _file_stamp(path)
+        self.model = model
+        self.error = None
+        self._listeners = []
+        self._loading = False
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        if model is not None:
+            self._ready.set()
+        elif background:
+            self._loading = True
+            threading.Thread(target=self._first_load, name="crop-model-load", daemon=True).start()
+        else:
+            self.model = warm_up(load_model(path, keep_estimator=keep_estimator))
+            self._ready.set()
+
+    def _first_load(self):
+        try:
+            self.model = warm_up(load_model(self.path, keep_estimator=self.keep_estimator))
+        except Exception as e:
+            self.error = e
+            logger.exception("Loading %s failed", self.path)
+        finally:
+            self._loading = False
+            self._ready.set()
+
+    @property
+    def ready(self):
+        """True once the first load has finished (successfully or not)."""
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the first load; True if a model is available."""
+        return self._ready.wait(timeout) and self.model is not None
+
+    def on_reload(self, callback):
+        """Call `callback(model)` after each swap to a newly loaded model."""
+        self._listeners.append(callback)
+
+    def current(self):
+        """The latest loaded model, starting a background reload if the file changed."""
+        if self.model is None:
+            self._ready.wait()
+            if self.model is None:
+                raise self.error
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval and not self._loading:
+            with self._lock:
+                if not self._loading and now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    try:
+                        stamp = _file_stamp(self.path)
+                    except OSError:
+                        stamp = self.version
+                    if stamp != self.version:
+                        self._loading = True
+                        threading.Thread(target=self._reload, args=(stamp,), name="crop-model-reload", daemon=True).start()
+        return self.model
+
+    def _reload(self, stamp):
+        try:
+            model = warm_up(load_model(self.path, keep_estimator=self.keep_estimator))
+            self.model, self.version = model, stamp
+            self.reloads += 1
+            logger.info("Crop model at %s changed on disk; now serving the new model.", self.path)
+            for callback in self._listeners:
+                callback(model)
+        except Exception:
+            # Keep serving the current model; the next check retries.
+            logger.exception("Reloading %s failed", self.path)
+        finally:
+            self._loading = False
+
+    def predict(self, X, *args, **kwargs):
+        return self.current().predict(X, *args, **kwargs)
+
+    def predict_proba(self, X, *args, **kwargs):
+        return self.current().predict_proba(X, *args, **kwargs)
+
+    @property
+    def classes_(self):
+        return self.current().classes_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the crop model as memory-mappable node arrays.")
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--out', default=COMPILED_MODEL_PATH)
+    args = parser.parse_args()
+
+    model = export_model(args.model, args.out)
+    size = sum(os.path.getsize(os.path.join(args.out, name)) for name in os.listdir(args.out))
+    print(f"Exported {model.n_estimators} trees, {model.n_nodes:,} nodes ({size / 1e6:.1f} MB) to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
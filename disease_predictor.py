@@ -1,52 +1,148 @@
-# disease_predictor.py
-
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2, preprocess_input, decode_predictions
-import numpy as np
-
-# Load a pre-trained model (MobileNetV2) for demonstration
-# For a real application, you would fine-tune this on the PlantVillage dataset
-model = MobileNetV2(weights='imagenet')
-
-# For the demo, we'll map a predicted class to a disease name.
-# In a real app, your model would be trained to output these classes directly.
-# This is a simplified mapping for the demo.
-CLASS_MAPPING = {
-    'bell_pepper': 'Pepper Bell Bacterial Spot',
-    'scab': 'Apple Scab',
-    'black_rot': 'Apple Black Rot',
-    'leaf_blight': 'Corn (Maize) Common Rust',
-    'spot_disease': 'Tomato Leaf Spot',
-    'strawberry': 'Strawberry Leaf Scorch'
-}
-
-def predict_disease(image_path):
-    """
-    Predicts the disease from an image file.
-    NOTE: This uses a generic ImageNet model. For real-world accuracy,
-    fine-tune a model on the PlantVillage dataset.
-    """
-    try:
-        img = image.load_img(image_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-
-        predictions = model.predict(img_array)
-        decoded_predictions = decode_predictions(predictions, top=1)[0]
-        
-        # Get the top prediction
-        top_prediction = decoded_predictions[0]
-        imagenet_id, label, score = top_prediction
-
-        # Demo logic: Check if the label contains a keyword we can map
-        for keyword, disease_name in CLASS_MAPPING.items():
-            if keyword in label.lower():
-                return f"{disease_name} (Confidence: {score:.2%})"
-
-        # If no keyword matches, return the top ImageNet class as a fallback
-        return f"Could not identify a specific plant disease. Best guess: {label.replace('_', ' ').title()} (Confidence: {score:.2%})"
-        
-    except Exception as e:
-        return f"Error processing image: {str(e)}"
\ No newline at end of file
+# disease_predictor.py
+
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+# Pre-trained MobileNetV2 weights. 'imagenet' downloads them on first use; point
+# SMARTAGRO_DISEASE_WEIGHTS at a local .h5 file to run offline at a kiosk.
+WEIGHTS = os.environ.get('SMARTAGRO_DISEASE_WEIGHTS', 'imagenet')
+# Optional local copy of Keras' imagenet_class_index.json, also for offline use.
+CLASS_INDEX_PATH = os.environ.get('SMARTAGRO_IMAGENET_CLASS_INDEX')
+
+IMAGE_SIZE = (224, 224)
+DEFAULT_BATCH_SIZE = 32
+
+# For the demo, we'll map a predicted class to a disease name.
+# In a real app, your model would be trained to output these classes directly.
+# This is a simplified mapping for the demo.
+CLASS_MAPPING = {
+    'bell_pepper': 'Pepper Bell Bacterial Spot',
+    'scab': 'Apple Scab',
+    'black_rot': 'Apple Black Rot',
+    'leaf_blight': 'Corn (Maize) Common Rust',
+    'spot_disease': 'Tomato Leaf Spot',
+    'strawberry': 'Strawberry Leaf Scorch'
+}
+
+_model = None
+_class_index = None
+_model_lock = threading.Lock()
+
+
+def get_model(weights=None):
+    """
+    Build the pre-trained model (MobileNetV2) on first use and warm it up once.
+    TensorFlow is only imported here, so importing this module stays cheap.
+    For a real application, you would fine-tune this on the PlantVillage dataset.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                start = time.perf_counter()
+                from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
+                model = MobileNetV2(weights=weights or WEIGHTS)
+                model(np.zeros((1, *IMAGE_SIZE, 3), dtype=np.float32), training=False)
+                _model = model
+                metrics.model_loaded('disease_model', time.perf_counter() - start)
+    return _model
+
+
+def _decode_top1(predictions):
+    """(label, score) of the top ImageNet class for every row of `predictions`."""
+    global _class_index
+    if CLASS_INDEX_PATH:
+        if _class_index is None:
+            with open(CLASS_INDEX_PATH) as f:
+                _class_index = {int(k): v[1] for k, v in json.load(f).items()}
+        top = predictions.argmax(axis=1)
+        return [(_class_index[i], float(row[i])) for i, row in zip(top, predictions)]
+    from tensorflow.keras.applications.mobilenet_v2 import decode_predictions
+    return [(top[0][1], float(top[0][2])) for top in decode_predictions(predictions, top=1)]
+
+
+def _describe(label, score):
+    # Demo logic: Check if the label contains a keyword we can map
+    for keyword, disease_name in CLASS_MAPPING.items():
+        if keyword in label.lower():
+            return f"{disease_name} (Confidence: {score:.2%})"
+
+    # If no keyword matches, return the top ImageNet class as a fallback
+    return f"Could not identify a specific plant disease. Best guess: {label.replace('_', ' ').title()} (Confidence: {score:.2%})"
+
+
+def load_image(source):
+    """
+    Decode and preprocess one image (path, file object or raw bytes) into a
+    (224, 224, 3) float32 array, exactly as keras' load_img + preprocess_input do.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if img.size != IMAGE_SIZE:
+            img = img.resize(IMAGE_SIZE, Image.NEAREST)
+        array = np.asarray(img, dtype=np.float32)
+    # MobileNetV2 preprocessing: scale pixels to [-1, 1].
+    return array / 127.5 - 1.0
+
+
+def _safe_load(source):
+    try:
+        return load_image(source)
+    except Exception as e:
+        return e
+
+
+def predict_diseases(images, batch_size=DEFAULT_BATCH_SIZE, max_workers=None, weights=None):
+    """
+    Diagnose many leaf photos in batched passes through the network.
+
+    `images` may be any iterable of file paths, file objects or raw bytes. Images
+    are decoded on a thread pool while the previous batch runs through the model,
+    and one result string per image is yielded in input order as each batch finishes.
+    `weights` overrides WEIGHTS if the model has not been built yet.
+    """
+    images = iter(images)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="leaf-decode") as pool:
+        pending = [pool.submit(_safe_load, src) for src in islice(images, batch_size)]
+        while pending:
+            # Start decoding the next batch before running this one through the model.
+            upcoming = [pool.submit(_safe_load, src) for src in islice(images, batch_size)]
+            arrays = [future.result() for future in pending]
+            decoded = [a for a in arrays if not isinstance(a, Exception)]
+            if decoded:
+                try:
+                    model = get_model(weights)
+                    with metrics.track('disease_predictor.model_batch'):
+                        predictions = np.asarray(model(np.stack(decoded), training=False))
+                    labels = iter(_decode_top1(predictions))
+                except Exception as e:
+                    arrays = [a if isinstance(a, Exception) else e for a in arrays]
+            for a in arrays:
+                if isinstance(a, Exception):
+                    yield f"Error processing image: {str(a)}"
+                else:
+                    yield _describe(*next(labels))
+            pending = upcoming
+
+
+@metrics.timed
+def predict_disease(image_path):
+    """
+    Predicts the disease from an image file.
+    NOTE: This uses a generic ImageNet model. For real-world accuracy,
+    fine-tune a model on the PlantVillage dataset.
+    """
+    return next(predict_diseases([image_path], batch_size=1, max_workers=1))
@@ -0,0 +1,202 @@
+# incremental_training.py
+# Keep the crop model current as labelled soil tests arrive, without full retrains.
+#
+# New rows go into the observation store (observation_store.py). An update grows the
+# random forest with warm_start: only `--new-trees` trees are fitted, on the most recent
+# `--window` rows plus a few older rows of every crop, and the oldest trees beyond
+# `--max-trees` are dropped, so the forest is a rolling window over the data. The model
+# file is then replaced atomically; ReloadingModel in the app and the SMS service picks
+# it up in the background. A crop never seen before forces one full retrain, on the
+# original dataset plus the store, since every tree in a forest must know the same set
+# of classes. Updates refuse to run on a store that was never seeded, and a model that
+# would know fewer crops than the current one is never saved.
+#
+# Usage:
+#   python incremental_training.py seed [--csv Crop_recommendation.csv]
+#   python incremental_training.py append new_soil_tests.csv [--update]
+#   python incremental_training.py update [--new-trees 10] [--max-trees 150] [--window 5000]
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from advisor import FEATURE_COLUMNS
+from crop_engine import COMPILED_MODEL_PATH, MODEL_PATH, export_model
+from observation_store import DEFAULT_STORE_PATH, ObservationStore
+from train_crop_model import DATASET_PATH, save_model
+
+DEFAULT_NEW_TREES = 10
+DEFAULT_MAX_TREES = 150
+DEFAULT_WINDOW = 5000
+# Older rows per crop mixed into every update, so each new tree sees every class.
+DEFAULT_ANCHOR_PER_CLASS = 20
+
+
+def _watermark_path(store):
+    return os.path.join(store.path, 'trained.json')
+
+
+def trained_rows(store):
+    """Rows of the store the current model has already been trained on."""
+    try:
+        with open(_watermark_path(store)) as f:
+            return json.load(f)['rows']
+    except FileNotFoundError:
+        return 0
+
+
+def _set_trained_rows(store, rows, mode):
+    path = _watermark_path(store)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({'rows': rows, 'mode': mode, 'updated': datetime.now(timezone.utc).isoformat(timespec='seconds')}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _frame(X):
+    # The model was fitted on a DataFrame; keep the feature names it expects.
+    return pd.DataFrame(X, columns=FEATURE_COLUMNS)
+
+
+def _training_window(store, window, anchor_per_class, seed):
+    """The last `window` rows plus up to `anchor_per_class` random earlier rows of every crop."""
+    n = store.n_rows
+    start = max(n - window, 0)
+    X, y = store.read(start)
+    if start and anchor_per_class:
+        X_old, y_old = store.read(0, start)
+        rng = np.random.default_rng(seed)
+        picks = []
+        for label in np.unique(y_old):
+            rows = np.flatnonzero(y_old == label)
+            picks.append(rng.choice(rows, min(anchor_per_class, len(rows)), replace=False))
+        picks = np.concatenate(picks)
+        X, y = np.concatenate([X_old[picks], X]), np.concatenate([y_old[picks], y])
+    return X, y
+
+
+def full_retrain(store, dataset=DATASET_PATH, n_estimators=100):
+    """A new forest on `dataset` plus every stored row, and the rows it was fitted on; rows in both (a seeded store) count once."""
+    X, y = store.read()
+    frame = _frame(X).assign(label=y)
+    if dataset and os.path.exists(dataset):
+        base = pd.read_csv(dataset)
+        # The store keeps float32 features; match them so seeded rows are recognised as duplicates.
+        base = base[FEATURE_COLUMNS].astype(np.float32).assign(label=base['label'].astype(str).str.strip().str.lower())
+        frame = pd.concat([base, frame], ignore_index=True).drop_duplicates()
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=-1)
+    model.fit(frame[FEATURE_COLUMNS], frame['label'].to_numpy())
+    return model, len(frame)
+
+
+def update(model_path=MODEL_PATH, store_path=DEFAULT_STORE_PATH, new_trees=DEFAULT_NEW_TREES,
+           max_trees=DEFAULT_MAX_TREES, window=DEFAULT_WINDOW, anchor_per_class=DEFAULT_ANCHOR_PER_CLASS):
+    """
+    Fold the rows added since the last update into the model at `model_path`.
+    Returns a report dict, or None when there is nothing new. Raises ValueError, leaving
+    the model untouched, when the update could lose crops the model knows.
+    """
+    start_time = time.perf_counter()
+    store = ObservationStore(store_path)
+    n, done = store.n_rows, trained_rows(store)
+    if n <= done:
+        return None
+    if done == 0:
+        raise ValueError(f"{store_path} was never seeded with the data the current model was trained on; "
+                         "run `python incremental_training.py seed` before appending.")
+
+    model = joblib.load(model_path)
+    if not isinstance(model, RandomForestClassifier):
+        raise ValueError(f"{model_path} holds a {type(model).__name__}; incremental updates grow a RandomForestClassifier. "
+                         "Retrain with train_crop_model.py (or export a random forest with train_variants.py) first.")
+    classes = model.classes_
+    X_new, y_new = store.read(done)
+    # Score the new rows before training on them: accuracy on data the model has not seen.
+    known = np.isin(y_new, model.classes_)
+    prequential = float(np.mean(model.predict(_frame(X_new)) == y_new)) if known.all() else None
+
+    X, y = _training_window(store, window, anchor_per_class, seed=n)
+    if not known.all():
+        mode = 'full'
+        model, trained_on = full_retrain(store, n_estimators=min(max_trees, 100))
+    else:
+        absent = np.setdiff1d(classes, y)
+        if len(absent):
+            raise ValueError(f"The training window has no rows of {', '.join(map(str, absent))}; "
+                             "raise --window or --anchor-per-class.")
+        mode, trained_on = 'incremental', len(y)
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees)
+        model.fit(_frame(X), y)
+        # Rolling window of trees: retire the oldest ones.
+        model.estimators_ = model.estimators_[-max_trees:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+
+    lost = np.setdiff1d(classes, model.classes_)
+    if len(lost):
+        raise ValueError(f"Not saving the {mode} update: it no longer knows {', '.join(map(str, lost))}.")
+    save_model(model, model_path)
+    if model_path == MODEL_PATH and os.path.isdir(COMPILED_MODEL_PATH):
+        export_model(model_path, COMPILED_MODEL_PATH)
+    _set_trained_rows(store, n, mode)
+    return {
+        'mode': mode,
+        'new_rows': n - done,
+        'trained_on': trained_on,
+        'trees': len(model.estimators_),
+        'prequential_accuracy': prequential,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+
+def _print_report(report):
+    if report is None:
+        print("No new observations since the last update.")
+        return
+    accuracy = 'n/a (new crop)' if report['prequential_accuracy'] is None else f"{report['prequential_accuracy'] * 100:.2f}%"
+    print(f"{report['mode']} update: {report['new_rows']} new rows, trained on {report['trained_on']}, "
+          f"{report['trees']} trees, accuracy on the new rows before training {accuracy}, {report['seconds']:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append labelled soil tests and update the crop model incrementally.")
+    parser.add_argument('command', choices=['seed', 'append', 'update'])
+    parser.add_argument('csv', nargs='?', help="CSV with the feature columns and 'label' (append).")
+    parser.add_argument('--csv', dest='seed_csv', default=DATASET_PATH, help="Dataset the current model was trained on (seed).")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--update', action='store_true', help="Run an update right after appending.")
+    parser.add_argument('--new-trees', type=int, default=DEFAULT_NEW_TREES)
+    parser.add_argument('--max-trees', type=int, default=DEFAULT_MAX_TREES)
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="Most recent rows the new trees are fitted on.")
+    parser.add_argument('--anchor-per-class', type=int, default=DEFAULT_ANCHOR_PER_CLASS)
+    args = parser.parse_args()
+
+    store = ObservationStore(args.store)
+    if args.command == 'seed':
+        if store.n_rows:
+            parser.error(f"{args.store} already holds {store.n_rows} rows.")
+        rows = store.append_csv(args.seed_csv)
+        # The current model was trained on this data already.
+        _set_trained_rows(store, rows, 'seed')
+        print(f"Seeded {args.store} with {rows} rows.")
+    elif args.command == 'append':
+        if not args.csv:
+            parser.error("append needs a CSV file.")
+        rows = store.append_csv(args.csv)
+        print(f"Appended {rows} rows ({store.n_rows} in the store, {store.n_rows - trained_rows(store)} not yet trained on).")
+    if args.command == 'update' or args.update:
+        try:
+            report = update(args.model, args.store, args.new_trees, args.max_trees, args.window, args.anchor_per_class)
+        except ValueError as e:
+            parser.error(str(e))
+        _print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+# irrigation_planner.py
+# Season-long irrigation schedules for every field of a village in one call.
+#
+# Inputs are a daily weather series (a local file standing in for a weather feed) and a
+# table of fields with their soil type, crop and sowing date. The root-zone water balance
+# of the FAO-56 method is stepped one day at a time for all fields at once: crop water use
+# is reference evapotranspiration (ET0) times a crop coefficient that follows the crop's
+# growth stage, rain refills the root zone and anything beyond field capacity drains away.
+# A field is irrigated back to field capacity when its depletion reaches the readily
+# available water, unless the day's rain will cover it.
+#
+# Weather CSV: date, rainfall (mm) and either et0 (mm) or temp_min and temp_max (°C),
+#              from which ET0 is estimated with the Hargreaves equation.
+# Fields CSV:  field_id, soil_type, crop, sowing_date and optionally area_acres. Fields
+#              without a crop, with a soil type that is not sandy, loamy or clay, or with
+#              an unreadable sowing date are left out of the plan and reported with the reason.
+#
+# Usage: python irrigation_planner.py weather.csv fields.csv schedule.csv [--summary summary.csv] [--daily daily.csv] [--rejected rejected.csv]
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from advisor import CROP_DATA
+
+# Per crop: crop coefficient at the initial, mid-season and late stages, maximum root
+# depth (m) and the share of the available water it can use before it is stressed.
+CROP_WATER = {
+    "rice": (1.05, 1.20, 0.90, 0.5, 0.20), "maize": (0.30, 1.20, 0.35, 1.0, 0.55), "chickpea": (0.40, 1.00, 0.35, 0.8, 0.50),
+    "kidneybeans": (0.40, 1.15, 0.35, 0.7, 0.45), "pigeonpeas": (0.40, 1.15, 0.35, 1.0, 0.50), "mothbeans": (0.40, 1.05, 0.35, 0.7, 0.50),
+    "mungbean": (0.40, 1.05, 0.35, 0.7, 0.45), "blackgram": (0.40, 1.05, 0.35, 0.7, 0.45), "lentil": (0.40, 1.10, 0.30, 0.6, 0.50),
+    "pomegranate": (0.50, 0.85, 0.70, 1.2, 0.50), "banana": (0.50, 1.10, 1.00, 0.6, 0.35), "mango": (0.60, 0.90, 0.75, 1.5, 0.50),
+    "grapes": (0.30, 0.85, 0.45, 1.2, 0.45), "watermelon": (0.40, 1.00, 0.75, 1.0, 0.40), "muskmelon": (0.50, 0.85, 0.60, 1.0, 0.40),
+    "apple": (0.60, 0.95, 0.75, 1.2, 0.50), "orange": (0.70, 0.65, 0.70, 1.2, 0.50), "papaya": (0.60, 1.00, 0.80, 0.9, 0.40),
+    "coconut": (0.95, 1.00, 1.00, 1.0, 0.65), "cotton": (0.35, 1.15, 0.60, 1.4, 0.65), "jute": (0.50, 1.15, 0.80, 1.0, 0.50),
+    "coffee": (0.90, 0.95, 0.95, 1.2, 0.40),
+}
+DEFAULT_CROP_WATER = (0.40, 1.05, 0.60, 1.0, 0.50)
+# Growth stages as fractions of the season: initial, development, mid-season, late.
+STAGE_ENDS = (0.20, 0.45, 0.80, 1.00)
+INITIAL_ROOT_DEPTH = 0.15
+
+# Plant-available water (mm per m of root depth) for the soil types analyze_soil_image reports.
+SOIL_WATER = {'sandy': 60.0, 'loamy': 140.0, 'clay': 170.0}
+
+# Share of pumped water that reaches the root zone (surface/furrow irrigation).
+DEFAULT_EFFICIENCY = 0.70
+M3_PER_MM_ACRE = 4.0469
+
+
+def field_problems(fields):
+    """Why each field cannot be planned, '' for those that can: missing crop, unknown soil type or invalid sowing date."""
+    crop = fields['crop'].fillna('').astype(str).str.strip()
+    soil = fields['soil_type'].fillna('').astype(str).str.lower()
+    return np.select([crop == '', ~soil.str.contains('sand|loam|clay'), fields['sowing_date'].isna().to_numpy()],
+                     ['missing crop', 'unknown soil type', 'invalid sowing date'], '')
+
+
+def soil_class(soil_type):
+    """'sandy', 'clay' or 'loamy' from a soil description such as 'Sandy Soil' or 'Clay Loam'."""
+    text = str(soil_type).lower()
+    return 'sandy' if 'sand' in text else 'clay' if 'clay' in text else 'loamy'
+
+
+def hargreaves_et0(dates, temp_min, temp_max, latitude):
+    """Reference evapotranspiration (mm/day) from daily temperatures (FAO-56 eq. 52)."""
+    day = pd.DatetimeIndex(dates).dayofyear.to_numpy()
+    phi = np.radians(latitude)
+    dr = 1 + 0.033 * np.cos(2 * np.pi * day / 365)
+    delta = 0.409 * np.sin(2 * np.pi * day / 365 - 1.39)
+    ws = np.arccos(np.clip(-np.tan(phi) * np.tan(delta), -1, 1))
+    ra = 24 * 60 / np.pi * 0.0820 * dr * (ws * np.sin(phi) * np.sin(delta) + np.cos(phi) * np.cos(delta) * np.sin(ws))
+    t_min, t_max = np.asarray(temp_min, dtype=np.float64), np.asarray(temp_max, dtype=np.float64)
+    return 0.0023 * 0.408 * ra * ((t_min + t_max) / 2 + 17.8) * np.sqrt(np.maximum(t_max - t_min, 0))
+
+
+def read_weather(source, latitude=15.0):
+    """Daily weather as a DataFrame with date, rainfall and et0, sorted and gap-free."""
+    weather = pd.read_csv(source)
+    weather.columns = [col.strip().lower() for col in weather.columns]
+    weather = weather.rename(columns={'rain': 'rainfall', 'rain_mm': 'rainfall', 'tmin': 'temp_min', 'tmax': 'temp_max'})
+    missing = [col for col in ('date', 'rainfall') if col not in weather.columns]
+    if 'et0' not in weather.columns and not {'temp_min', 'temp_max'} <= set(weather.columns):
+        missing.append('et0 (or temp_min and temp_max)')
+    if missing:
+        raise ValueError(f"Weather file is missing columns: {', '.join(missing)}")
+    if weather.empty:
+        raise ValueError("Weather file has no rows.")
+    weather['date'] = pd.to_datetime(weather['date'], errors='coerce')
+    # Rain left blank means none fell; a blank ET0 or temperature would silently turn the
+    # water balance into NaN for the rest of the season, so those must be complete.
+    needed = ['date'] + (['et0'] if 'et0' in weather.columns else ['temp_min', 'temp_max'])
+    for col in needed[1:]:
+        weather[col] = pd.to_numeric(weather[col], errors='coerce')
+    bad = [col for col in needed if weather[col].isna().any()]
+    if bad:
+        rows = np.flatnonzero(weather[bad].isna().any(axis=1).to_numpy()) + 1
+        shown = ', '.join(map(str, rows[:5])) + (', ...' if len(rows) > 5 else '')
+        raise ValueError(f"Weather file has missing or non-numeric {', '.join(bad)} values in rows {shown}.")
+    weather = weather.sort_values('date').drop_duplicates('date').set_index('date')
+    days = pd.date_range(weather.index[0], weather.index[-1], freq='D')
+    if len(days) != len(weather):
+        raise ValueError(f"Weather file has {len(days) - len(weather)} missing days between {days[0]:%Y-%m-%d} and {days[-1]:%Y-%m-%d}.")
+    if 'et0' not in weather.columns:
+        weather['et0'] = hargreaves_et0(weather.index, weather['temp_min'], weather['temp_max'], latitude)
+    weather['rainfall'] = pd.to_numeric(weather['rainfall'], errors='coerce').fillna(0.0)
+    return weather[['rainfall', 'et0']].reset_index()
+
+
+def read_fields(source):
+    """Field table with field_id, soil_type, crop, sowing_date and area_acres."""
+    fields = pd.read_csv(source)
+    fields.columns = [col.strip().lower() for col in fields.columns]
+    missing = [col for col in ('field_id', 'soil_type', 'crop', 'sowing_date') if col not in fields.columns]
+    if missing:
+        raise ValueError(f"Fields file is missing columns: {', '.join(missing)}")
+    fields['crop'] = fields['crop'].fillna('').astype(str).str.strip().str.lower()
+    # Unreadable dates become NaT; plan_irrigation reports those fields instead of failing on them.
+    fields['sowing_date'] = pd.to_datetime(fields['sowing_date'], errors='coerce')
+    fields['area_acres'] = pd.to_numeric(fields['area_acres'], errors='coerce').fillna(1.0) if 'area_acres' in fields.columns else 1.0
+    return fields
+
+
+def _stage_tables(crops, soils):
+    """
+    Per (crop, soil) combination and day since sowing: crop coefficient, total available
+    water (mm) and readily available water (mm). Fields look their day up in these
+    tables instead of recomputing growth curves every day.
+    """
+    seasons = np.array([CROP_DATA.get(c, {}).get('maturity_days', 100) for c in crops])
+    ages = np.arange(seasons.max() + 1)
+    kc, taw, raw = [], [], []
+    for crop, season in zip(crops, seasons):
+        kc_ini, kc_mid, kc_end, root_max, p = CROP_WATER.get(crop, DEFAULT_CROP_WATER)
+        frac = np.minimum(ages / season, 1.0)
+        stages = np.array(STAGE_ENDS)
+        crop_kc = np.interp(frac, [0, *stages], [kc_ini, kc_ini, kc_mid, kc_mid, kc_end])
+        # Roots grow from the seed depth to their maximum over the initial and development stages.
+        roots = INITIAL_ROOT_DEPTH + (root_max - INITIAL_ROOT_DEPTH) * np.minimum(frac / stages[1], 1.0)
+        for soil in soils:
+            kc.append(crop_kc)
+            taw.append(SOIL_WATER[soil] * roots)
+            raw.append(p * SOIL_WATER[soil] * roots)
+    return seasons, np.array(kc), np.array(taw), np.array(raw)
+
+
+@metrics.timed
+def simulate(weather, fields, efficiency=DEFAULT_EFFICIENCY):
+    """
+    Step the root-zone water balance of every field through the weather series.
+    Returns (events, summary): events holds one row per irrigation (field row index,
+    day index, net and gross mm); summary holds per-field arrays.
+    """
+    crops = sorted(fields['crop'].unique())
+    soils = sorted(SOIL_WATER)
+    crop_idx = np.searchsorted(crops, fields['crop'].to_numpy())
+    soil_idx = np.searchsorted(soils, fields['soil_type'].map(soil_class).to_numpy())
+    combo = crop_idx * len(soils) + soil_idx
+    seasons, kc_table, taw_table, raw_table = _stage_tables(crops, soils)
+    season = seasons[crop_idx]
+
+    start = weather['date'].iloc[0]
+    sown = ((fields['sowing_date'] - start).dt.days).to_numpy()
+    rain = weather['rainfall'].to_numpy(dtype=np.float64)
+    et0 = weather['et0'].to_numpy(dtype=np.float64)
+    n_days, n_fields = len(weather), len(fields)
+
+    # Row of each field's (crop, soil) curves in the flattened stage tables, offset so
+    # that adding the day index gives the entry for the field's age on that day.
+    width = kc_table.shape[1]
+    kc_flat, taw_flat, raw_flat = kc_table.ravel(), taw_table.ravel(), raw_table.ravel()
+    table_offset = combo * width - sown
+    harvest = sown + season
+
+    # Root-zone depletion below field capacity (mm); fields start at capacity when sown.
+    depletion = np.zeros(n_fields)
+    water_use = np.zeros(n_fields)
+    stress_days = np.zeros(n_fields, dtype=np.int64)
+    event_day, event_field, event_mm = [], [], []
+
+    first, last = max(int(sown.min()), 0), min(int(harvest.max()), n_days)
+    for day in range(first, last):
+        # Only fields in season take part; each day works on that subset.
+        growing = np.flatnonzero((sown <= day) & (harvest > day))
+        if not len(growing):
+            continue
+        at = table_offset[growing] + day
+        taw, raw = taw_flat[at], raw_flat[at]
+        dep = depletion[growing]
+        # Irrigate back to field capacity once the readily available water is used up,
+        # unless today's rain refills the root zone anyway.
+        irrigate = (dep >= raw) & (rain[day] < dep)
+        if irrigate.any():
+            event_day.append(np.full(np.count_nonzero(irrigate), day))
+            event_field.append(growing[irrigate])
+            event_mm.append(dep[irrigate])
+            dep[irrigate] = 0.0
+        # Water stress coefficient: transpiration drops once depletion exceeds RAW.
+        ks = np.clip((taw - dep) / np.maximum(taw - raw, 1e-9), 0.0, 1.0)
+        et = ks * kc_flat[at] * et0[day]
+        depletion[growing] = np.clip(dep - rain[day] + et, 0.0, taw)
+        water_use[growing] += et
+        stress_days[growing] += ks < 1.0
+
+    if event_day:
+        events = {'day': np.concatenate(event_day), 'field': np.concatenate(event_field), 'net_mm': np.concatenate(event_mm)}
+    else:
+        events = {'day': np.empty(0, dtype=np.int64), 'field': np.empty(0, dtype=np.int64), 'net_mm': np.empty(0)}
+    events['gross_mm'] = events['net_mm'] / efficiency
+    # Seasons that start before or run past the weather series are only partly planned.
+    summary = {'crop_water_use_mm': water_use, 'stress_days': stress_days, 'season_complete': (sown >= 0) & (harvest <= n_days)}
+    return events, summary
+
+
+def plan_irrigation(weather, fields, efficiency=DEFAULT_EFFICIENCY):
+    """
+    Irrigation plan for every field. Returns a dict of DataFrames:
+      schedule  one row per irrigation: field_id, date, net_mm, gross_mm, water_m3
+      summary   per field: events, total irrigation (mm and m³), crop water use, stress days
+      daily     water the whole village pumps each day (m³), for pump and canal planning
+      rejected  fields that could not be planned: row (in `fields`, from 1), field_id, reason
+    """
+    problems = field_problems(fields)
+    bad = problems != ''
+    rejected = pd.DataFrame({'row': np.flatnonzero(bad) + 1, 'field_id': fields['field_id'].to_numpy()[bad], 'reason': problems[bad]})
+    if bad.all():
+        reasons = ', '.join(f"{count} {reason}" for reason, count in rejected['reason'].value_counts().items())
+        raise ValueError(f"None of the {len(fields)} fields can be planned ({reasons}).")
+    fields = fields[~bad].reset_index(drop=True)
+
+    events, summary = simulate(weather, fields, efficiency)
+    area = fields['area_acres'].to_numpy(dtype=np.float64)
+    water_m3 = events['gross_mm'] * area[events['field']] * M3_PER_MM_ACRE
+
+    schedule = pd.DataFrame({
+        'field_id': fields['field_id'].to_numpy()[events['field']],
+        'date': weather['date'].to_numpy()[events['day']],
+        'net_mm': np.round(events['net_mm'], 1),
+        'gross_mm': np.round(events['gross_mm'], 1),
+        'water_m3': np.round(water_m3, 1),
+    }).sort_values(['date', 'field_id'], kind='stable').reset_index(drop=True)
+
+    n = len(fields)
+    irrigation_mm = np.bincount(events['field'], weights=events['gross_mm'], minlength=n)
+    first_day = np.full(n, len(weather))
+    np.minimum.at(first_day, events['field'], events['day'])
+    dates = weather['date'].to_numpy()
+    out = fields[['field_id', 'crop', 'soil_type', 'sowing_date', 'area_acres']].copy()
+    out['irrigations'] = np.bincount(events['field'], minlength=n)
+    out['first_irrigation'] = np.where(first_day < len(weather), dates[np.minimum(first_day, len(weather) - 1)], np.datetime64('NaT'))
+    out['irrigation_mm'] = np.round(irrigation_mm, 1)
+    out['water_m3'] = np.round(irrigation_mm * area * M3_PER_MM_ACRE, 1)
+    out['crop_water_use_mm'] = np.round(summary['crop_water_use_mm'], 1)
+    out['stress_days'] = summary['stress_days']
+    out['season_complete'] = summary['season_complete']
+
+    daily = pd.DataFrame({'date': dates, 'water_m3': np.round(np.bincount(events['day'], weights=water_m3, minlength=len(weather)), 1),
+                          'fields_irrigated': np.bincount(events['day'], minlength=len(weather))})
+    return {'schedule': schedule, 'summary': out, 'daily': daily, 'rejected': rejected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Season-long irrigation schedules for a table of fields.")
+    parser.add_argument('weather', help="Daily weather CSV: date, rainfall and et0 (or temp_min/temp_max).")
+    parser.add_argument('fields', help="Fields CSV: field_id, soil_type, crop, sowing_date[, area_acres].")
+    parser.add_argument('schedule', help="Output CSV with one row per irrigation.")
+    parser.add_argument('--summary', help="Also write per-field totals to this CSV.")
+    parser.add_argument('--daily', help="Also write the village's daily water demand to this CSV.")
+    parser.add_argument('--rejected', help="Write the fields that could not be planned, with the reason, to this CSV.")
+    parser.add_argument('--latitude', type=float, default=15.0, help="Used to estimate ET0 when the weather file has no et0 column.")
+    parser.add_argument('--efficiency', type=float, default=DEFAULT_EFFICIENCY, help="Share of pumped water that reaches the roots.")
+    args = parser.parse_args()
+
+    try:
+        plan = plan_irrigation(read_weather(args.weather, args.latitude), read_fields(args.fields), args.efficiency)
+    except ValueError as e:
+        parser.error(str(e))
+    plan['schedule'].to_csv(args.schedule, index=False)
+    if args.summary:
+        plan['summary'].to_csv(args.summary, index=False)
+    if args.daily:
+        plan['daily'].to_csv(args.daily, index=False)
+    if args.rejected:
+        plan['rejected'].to_csv(args.rejected, index=False)
+    summary = plan['summary']
+    print(f"{len(summary)} fields, {len(plan['schedule'])} irrigations, {summary['water_m3'].sum():,.0f} m³ of water in total")
+    if len(plan['rejected']):
+        print(f"{len(plan['rejected'])} fields could not be planned{' -> ' + args.rejected if args.rejected else ' (list them with --rejected)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# kiosk_batch.py
+# Batch crop recommendations for kiosk operators: soil-test CSV in, recommendations out.
+#
+# Usage: python kiosk_batch.py soil_tests.csv recommendations.csv [--chunksize 20000]
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from advisor import FEATURE_COLUMNS, fertilizer_doses, normalize_columns, scoreable_rows
+
+# Rows read, scored and written per step. Bounds memory regardless of file size.
+DEFAULT_CHUNKSIZE = 20_000
+
+
+@metrics.timed
+def recommend_chunk(crop_model, chunk):
+    """Score one DataFrame of soil tests with a single vectorized predict call."""
+    chunk = normalize_columns(chunk)
+    features = chunk[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    # Blank, non-numeric and infinite cells, and numbers too large for the model's float32
+    # inputs, make a row unscoreable; the rest of the chunk is still scored.
+    invalid = ~scoreable_rows(features)
+
+    crops = np.full(len(chunk), '', dtype=object)
+    if (~invalid).any():
+        crops[~invalid] = crop_model.predict(features.to_numpy()[~invalid])
+
+    n_diff, rec_urea, rec_dap = fertilizer_doses(features['N'], features['P'])
+    out = chunk.copy()
+    out['recommended_crop'] = crops
+    out['nitrogen_status'] = np.where(invalid, '', np.where(n_diff > 0, 'low', 'high'))
+    out['urea_kg'] = np.round(rec_urea, 1)
+    out['dap_kg'] = np.round(rec_dap, 1)
+    out.loc[invalid, ['urea_kg', 'dap_kg']] = np.nan
+    return out
+
+
+def iter_recommendations(crop_model, source, chunksize=DEFAULT_CHUNKSIZE):
+    """Read `source` (path or file object) in chunks and yield scored DataFrames."""
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        yield recommend_chunk(crop_model, chunk)
+
+
+def write_recommendations_csv(crop_model, source, dest, chunksize=DEFAULT_CHUNKSIZE):
+    """Stream recommendations for every row of `source` into the CSV `dest`. Returns the row count."""
+    rows = 0
+    for i, scored in enumerate(iter_recommendations(crop_model, source, chunksize)):
+        scored.to_csv(dest, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows += len(scored)
+    return rows
+
+
+def write_recommendations_excel(crop_model, source, dest, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Stream recommendations into an .xlsx file using openpyxl's write-only mode,
+    which flushes rows to disk instead of holding the whole sheet in memory.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ImportError("Excel export needs the optional `openpyxl` package.") from e
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Recommendations")
+    rows = 0
+    for i, scored in enumerate(iter_recommendations(crop_model, source, chunksize)):
+        if i == 0:
+            sheet.append([str(col) for col in scored.columns])
+        scored = scored.astype(object).where(scored.notna(), None)
+        for record in scored.itertuples(index=False, name=None):
+            sheet.append(list(record))
+        rows += len(scored)
+    workbook.save(dest)
+    return rows
+
+
+def main():
+    from crop_engine import MODEL_PATH, load_model
+
+    parser = argparse.ArgumentParser(description="Batch crop recommendations for a CSV of soil tests.")
+    parser.add_argument('source', help="CSV with N, P, K, temperature, humidity, ph and rainfall columns.")
+    parser.add_argument('dest', help="Output path; .xlsx writes Excel, anything else writes CSV.")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--model', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    # A bulk run: keep the scikit-learn estimator, which scores large chunks faster.
+    crop_model = load_model(args.model, keep_estimator=True)
+    writer = write_recommendations_excel if args.dest.lower().endswith('.xlsx') else write_recommendations_csv
+    rows = writer(crop_model, args.source, args.dest, args.chunksize)
+    print(f"Wrote {rows} recommendations to {args.dest}")
+
+
+if __name__ == '__main__':
+    main()
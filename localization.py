@@ -0,0 +1,38 @@
+# localization.py
+# UI text and localized knowledge bases, read one language at a time.
+#
+# locales/<lang>.json holds everything shown to a farmer in that language: the UI strings
+# ('ui'), crop action plans, the threat database and the SMS, fertilizer, watering and
+# harvest advice templates. A language is read the first time it is asked for, so startup
+# pays only for the languages sessions actually use. Languages without a file fall back
+# to English; missing UI strings fall back to the defaults passed to T.get in the app.
+#
+# Usage: import localization; T = localization.text('kn')
+
+import functools
+import json
+import os
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+DEFAULT_LANGUAGE = 'en'
+
+
+@functools.lru_cache(maxsize=None)
+def resources(lang):
+    """Everything localized for `lang`. Shared between callers; do not modify it."""
+    path = os.path.join(LOCALE_DIR, f'{lang}.json')
+    if lang != DEFAULT_LANGUAGE and not os.path.exists(path):
+        return resources(DEFAULT_LANGUAGE)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def languages():
+    """Codes of the languages that have a locale file, e.g. ('en', 'hi', 'kn')."""
+    return tuple(sorted(name[:-len('.json')] for name in os.listdir(LOCALE_DIR) if name.endswith('.json')))
+
+
+def text(lang):
+    """UI strings for `lang`."""
+    return resources(lang)['ui']
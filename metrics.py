@@ -0,0 +1,312 @@
+# metrics.py
+# Lightweight in-process metrics for the app, the SMS service and the batch tools.
+#
+# Call counts, latency histograms, cache hit rates and model-load events, labelled by
+# function and by the Streamlit tab that made the call. Exported in the Prometheus
+# text format, either over HTTP (/metrics) or as a file for a textfile collector.
+#
+# Set SMARTAGRO_METRICS=0 to turn recording off; enable()/disable() switch it at runtime.
+# SMARTAGRO_METRICS_PORT / SMARTAGRO_METRICS_FILE make the Streamlit app export.
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second model loads.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_enabled = os.environ.get('SMARTAGRO_METRICS', '1').lower() not in ('0', 'false', 'off', 'no')
+# The Streamlit tab whose code is running; '' outside the app.
+_current_tab = contextvars.ContextVar('smartagro_tab', default='')
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """A value that can go up and down, e.g. a timestamp or a cache size."""
+
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Bucketed observations (Prometheus cumulative histogram) per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, f'le="{le}"'), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    """Metrics plus collectors that read counters kept elsewhere (e.g. LRU cache stats)."""
+
+    def __init__(self):
+        self._metrics = []
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name, stats):
+        """Export a cache's hits, misses and size; `stats` returns a dict like LRUCache.stats()."""
+        with self._lock:
+            self._caches[name] = stats
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics, caches = list(self._metrics), dict(self._caches)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        if caches:
+            stats = {name: fn() for name, fn in caches.items()}
+            for field, kind, help in (('hits', 'counter', "Cache lookups answered from the cache."),
+                                      ('misses', 'counter', "Cache lookups that fell through."),
+                                      ('size', 'gauge', "Entries currently held.")):
+                metric = f"smartagro_cache_{field}_total" if kind == 'counter' else f"smartagro_cache_{field}"
+                lines.append(f"# HELP {metric} {help}")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.extend(f'{metric}{{cache="{_escape(name)}"}} {s.get(field, 0)}' for name, s in stats.items())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CALLS = REGISTRY.register(Counter('smartagro_calls_total', "Instrumented function calls.", ('function', 'tab')))
+ERRORS = REGISTRY.register(Counter('smartagro_call_errors_total', "Instrumented calls that raised.", ('function', 'tab')))
+LATENCY = REGISTRY.register(Histogram('smartagro_call_duration_seconds', "Wall time of instrumented calls.", ('function', 'tab')))
+TAB_RENDERS = REGISTRY.register(Histogram('smartagro_tab_render_seconds', "Wall time of Streamlit tab (fragment) runs.", ('tab',)))
+MODEL_LOADS = REGISTRY.register(Counter('smartagro_model_loads_total', "Models loaded from disk or built.", ('model',)))
+MODEL_LOAD_TIME = REGISTRY.register(Histogram('smartagro_model_load_seconds', "Time to load or build a model.", ('model',)))
+MODEL_LOADED_AT = REGISTRY.register(Gauge('smartagro_model_last_load_timestamp_seconds', "Unix time of the latest model load.", ('model',)))
+
+
+def register_cache(name, stats):
+    REGISTRY.register_cache(name, stats)
+
+
+def observe_call(function, seconds, failed=False):
+    """Record one call of `function` that took `seconds`."""
+    if not _enabled:
+        return
+    tab = _current_tab.get()
+    CALLS.inc(function, tab)
+    LATENCY.observe(function, tab, value=seconds)
+    if failed:
+        ERRORS.inc(function, tab)
+
+
+class track:
+    """
+    Time a block (context manager) or every call of a function (decorator) under `name`.
+    When recording is off the only cost is one flag check.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._start is not None:
+            observe_call(self.name, time.perf_counter() - self._start, failed=exc_type is not None)
+        return False
+
+    def __call__(self, fn):
+        name = self.name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                observe_call(name, time.perf_counter() - start, failed=True)
+                raise
+            observe_call(name, time.perf_counter() - start)
+            return result
+        return wrapper
+
+
+def timed(fn):
+    """Decorator: track(fn's module.qualname)."""
+    return track(f"{fn.__module__}.{fn.__qualname__}")(fn)
+
+
+class tab:
+    """
+    Attribute calls made inside the block (or decorated function) to a Streamlit tab
+    and time the tab's run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._token = _current_tab.set(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_tab.reset(self._token)
+        if _enabled:
+            TAB_RENDERS.observe(self.name, value=time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, fn):
+        name = self.name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tab(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def model_loaded(model, seconds):
+    """Record a model-load event."""
+    if not _enabled:
+        return
+    MODEL_LOADS.inc(model)
+    MODEL_LOAD_TIME.observe(model, value=seconds)
+    MODEL_LOADED_AT.set(model, value=time.time())
+
+
+def render():
+    return REGISTRY.render()
+
+
+def write_textfile(path):
+    """Dump the metrics to `path` atomically, e.g. for node_exporter's textfile collector."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_file_dumper(path, interval=15.0):
+    """Rewrite `path` every `interval` seconds from a daemon thread; returns a stop Event."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            write_textfile(path)
+    write_textfile(path)
+    threading.Thread(target=loop, name='metrics-file', daemon=True).start()
+    return stop
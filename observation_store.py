@@ -0,0 +1,95 @@
+# observation_store.py
+# Append-only columnar store of labelled soil tests collected at kiosks.
+#
+# Each append becomes one chunk: a float32 feature matrix and a label array saved as
+# .npy files, listed in manifest.json. The manifest is replaced atomically after the
+# chunk files are written, so readers only ever see complete chunks, and reads
+# memory-map the chunks instead of parsing CSV.
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from advisor import FEATURE_COLUMNS, normalize_columns, scoreable_rows
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'observations')
+LABEL_COLUMN = 'label'
+
+
+class ObservationStore:
+    """Chunked .npy store of (features, label) rows; see the module comment."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'columns': FEATURE_COLUMNS, 'chunks': []}
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self._manifest_path)
+
+    @property
+    def n_rows(self):
+        return sum(chunk['rows'] for chunk in self.manifest()['chunks'])
+
+    def append(self, frame):
+        """
+        Add the rows of a DataFrame with the feature columns and a 'label' column.
+        Rows with missing, non-numeric or infinite values, or values too large for float32,
+        are dropped: one such row would make every later retrain fail. Returns the rows stored.
+        """
+        frame = normalize_columns(frame)
+        if LABEL_COLUMN not in frame.columns:
+            raise ValueError(f"Observations need a '{LABEL_COLUMN}' column with the crop that was grown.")
+        features = frame[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        labels = frame[LABEL_COLUMN].astype('string').str.strip().str.lower()
+        valid = scoreable_rows(features) & (labels.notna() & (labels != '')).to_numpy()
+        if not valid.any():
+            return 0
+        X = features.to_numpy(dtype=np.float64)[valid].astype(np.float32)
+        y = labels.to_numpy(dtype=str)[valid]
+
+        manifest = self.manifest()
+        name = f"{len(manifest['chunks']) + 1:06d}"
+        np.save(os.path.join(self.path, f"{name}.features.npy"), X)
+        np.save(os.path.join(self.path, f"{name}.labels.npy"), y)
+        manifest['chunks'].append({'name': name, 'rows': int(len(X)), 'added': datetime.now(timezone.utc).isoformat(timespec='seconds')})
+        self._write_manifest(manifest)
+        return int(len(X))
+
+    def append_csv(self, source, chunksize=100_000):
+        """Append a CSV (path or file object) chunk by chunk. Returns the rows stored."""
+        return sum(self.append(chunk) for chunk in pd.read_csv(source, chunksize=chunksize))
+
+    def read(self, start=0, stop=None):
+        """Rows [start, stop) in insertion order as (X float32, y str), reading only the chunks involved."""
+        stop = self.n_rows if stop is None else stop
+        Xs, ys, offset = [], [], 0
+        for chunk in self.manifest()['chunks']:
+            lo, hi = max(start - offset, 0), min(stop - offset, chunk['rows'])
+            if lo < hi:
+                X = np.load(os.path.join(self.path, f"{chunk['name']}.features.npy"), mmap_mode='r')
+                y = np.load(os.path.join(self.path, f"{chunk['name']}.labels.npy"), mmap_mode='r')
+                Xs.append(np.asarray(X[lo:hi]))
+                ys.append(np.asarray(y[lo:hi]))
+            offset += chunk['rows']
+            if offset >= stop:
+                break
+        if not Xs:
+            return np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32), np.empty(0, dtype=str)
+        return np.concatenate(Xs), np.concatenate(ys)
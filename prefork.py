@@ -0,0 +1,165 @@
+# prefork.py
+# Preforking launcher for the SMS/IVR service.
+#
+# The parent loads the crop model (and the SMS table / recommendation cache) once,
+# binds the listening socket and forks the workers, so model memory is shared
+# between them instead of duplicated. When crop_model.pkl has an up-to-date
+# node-array export (python crop_engine.py export), load_model memory-maps that
+# instead: its pages live in the page cache once per node, and workers never need to
+# import sklearn. A retrained pickle without a fresh export is served from the pickle,
+# and the workers' ReloadingModel follows the pickle either way, with or without a cache.
+#
+# The leaf-disease network is not preloaded: TensorFlow is not fork-safe once its
+# runtime has started, so each worker still builds it lazily on first use.
+#
+# Usage: python prefork.py [--workers 4] [--port 8080] [--model crop_model.pkl] [--load-in-workers]
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+from crop_engine import MODEL_PATH, ReloadingModel, load_model
+from recommendation_cache import DEFAULT_MAXSIZE, DEFAULT_TABLE_PATH, RecommendationCache
+from sms_service import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, RecommendationService
+
+logger = logging.getLogger("smartagro.prefork")
+
+
+def memory_usage(pid='self'):
+    """
+    RSS, PSS and USS of a process in MB (Linux). RSS counts shared pages in full in
+    every process; PSS splits them between the sharers; USS is what only it holds.
+    """
+    usage = {'rss_mb': 0.0, 'pss_mb': 0.0, 'uss_mb': 0.0}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            field, _, rest = line.partition(':')
+            if field in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                mb = int(rest.split()[0]) / 1024
+                key = {'Rss': 'rss_mb', 'Pss': 'pss_mb'}.get(field, 'uss_mb')
+                usage[key] += mb
+    return usage
+
+
+def child_pids(pid):
+    """Live child processes of `pid`."""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields after it are fixed.
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def preload(model_path, cache_size=DEFAULT_MAXSIZE, table_path=DEFAULT_TABLE_PATH):
+    """Everything the workers share: the crop model and the recommendation cache/table."""
+    # Follows the file whether or not there is a cache (the cache shares this watcher).
+    crop_model = ReloadingModel(model_path, model=load_model(model_path))
+    cache = RecommendationCache(crop_model, model_path, cache_size, table_path=table_path) if cache_size > 0 else None
+    return crop_model, cache
+
+
+def _run_worker(sock, args, preloaded):
+    # Runs in the forked child; never returns.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        crop_model, cache = preloaded or preload(args.model, args.cache_size, args.sms_table)
+        service = RecommendationService(crop_model, args.max_batch_size, args.max_wait_ms / 1000, cache=cache)
+        asyncio.run(service.serve(sock=sock))
+    except Exception:
+        logger.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def spawn_worker(sock, args, preloaded):
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(sock, args, preloaded)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several SMS service workers that share one copy of the models.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model', default=MODEL_PATH,
+                        help="Model pickle; a matching node-array export next to it is memory-mapped and shared.")
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAXSIZE, help="Recommendation cache entries per worker; 0 disables caching.")
+    parser.add_argument('--sms-table', default=DEFAULT_TABLE_PATH)
+    parser.add_argument('--load-in-workers', action='store_true', help="Load the models in every worker after forking (no sharing), for comparison.")
+    parser.add_argument('--memory-report-interval', type=float, default=0, help="Log per-worker RSS/PSS/USS every N seconds.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(process)d] %(message)s")
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.setblocking(False)
+
+    preloaded = None
+    if not args.load_in_workers:
+        start = time.perf_counter()
+        preloaded = preload(args.model, args.cache_size, args.sms_table)
+        logger.info("Loaded %s in %.2f s before forking", args.model, time.perf_counter() - start)
+    # Move everything allocated so far out of the collector's reach, so collections in
+    # the workers don't write to (and un-share) the pages holding those objects.
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn_worker(sock, args, preloaded) for _ in range(args.workers)}
+    logger.info("Serving on %s:%d with %d workers", args.host, args.port, len(workers))
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + args.memory_report_interval
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if args.memory_report_interval and time.monotonic() >= next_report:
+                next_report = time.monotonic() + args.memory_report_interval
+                for worker in sorted(workers):
+                    try:
+                        usage = memory_usage(worker)
+                    except OSError:
+                        continue
+                    logger.info("worker %d: RSS %.1f MB, PSS %.1f MB, USS %.1f MB", worker, usage['rss_mb'], usage['pss_mb'], usage['uss_mb'])
+            time.sleep(0.2)
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning("Worker %d exited (status %d); starting a replacement.", pid, status)
+            time.sleep(1.0)  # don't spin if workers die at startup
+            workers.add(spawn_worker(sock, args, preloaded))
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
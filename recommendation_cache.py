@@ -0,0 +1,311 @@
+# recommendation_cache.py
+# Memoized crop recommendations for the SMS/IVR path.
+#
+# Inputs are quantized to the precision the UI collects (whole N/P/K, 0.1 steps for
+# everything else) and the crop plus fertilizer numbers are kept in a bounded LRU.
+# Optionally, a precomputed table covering every SMS keypad input is memory-mapped
+# so most lookups are a single array index.
+#
+# Build the table: python recommendation_cache.py build [--out sms_table.npy]
+
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+import advisor
+import metrics
+from cache_utils import LRUCache
+from crop_engine import MODEL_PATH, CompiledForest, ReloadingModel, load_model, model_digest
+
+logger = logging.getLogger("smartagro.recommendation_cache")
+
+DEFAULT_MAXSIZE = 8192
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sms_table.npy')
+
+# Keypad ranges accepted by the SMS tab: whole N/P/K in 0-200, pH in 0.0-14.0.
+SMS_NPK_MAX = 200
+SMS_PH_STEPS = 140  # pH * 10
+# Model feature positions of the four inputs a keypad farmer sends.
+SMS_FREE_FEATURES = (0, 1, 2, 5)
+# Quantized temperature, humidity and rainfall every SMS request carries.
+SMS_WEATHER_KEY = (round(advisor.SMS_DEFAULT_TEMPERATURE * 10), round(advisor.SMS_DEFAULT_HUMIDITY * 10), round(advisor.SMS_DEFAULT_RAINFALL * 10))
+
+
+def quantize(features):
+    """Cache key: whole N/P/K and tenths for temperature, humidity, pH and rainfall."""
+    n, p, k, temp, hum, ph, rain = (float(x) for x in features)
+    return (round(n), round(p), round(k), round(temp * 10), round(hum * 10), round(ph * 10), round(rain * 10))
+
+
+def quantize_batch(X):
+    """quantize for every row of X at once, as an (n_rows, 7) int64 array."""
+    X = np.asarray(X, dtype=np.float64)
+    return np.rint(X * np.array([1, 1, 1, 10, 10, 10, 10])).astype(np.int64)
+
+
+def dequantize(key):
+    """Model input row for a cache key."""
+    n, p, k, temp, hum, ph, rain = key
+    return [n, p, k, temp / 10, hum / 10, ph / 10, rain / 10]
+
+
+def dequantize_batch(keys):
+    """dequantize for every row of an (n_rows, 7) array of keys."""
+    return np.asarray(keys) / np.array([1, 1, 1, 10, 10, 10, 10])
+
+
+def _meta_path(table_path):
+    return os.path.splitext(table_path)[0] + '.meta.npz'
+
+
+def _sms_grids():
+    """Every keypad value for each free feature, as the float32 the model compares."""
+    npk = np.arange(SMS_NPK_MAX + 1, dtype=np.float32)
+    ph = (np.arange(SMS_PH_STEPS + 1) / 10).astype(np.float32)
+    return [npk, npk, npk, ph]
+
+
+def _reachable_thresholds(crop_model, fixed):
+    """
+    Thresholds on each free feature that can still be reached once the fixed SMS
+    weather features are substituted into every tree.
+    """
+    thresholds = {f: [] for f in SMS_FREE_FEATURES}
+    stack = list(crop_model.roots)
+    while stack:
+        node = stack.pop()
+        if crop_model.is_leaf[node]:
+            continue
+        feature = int(crop_model.feature[node])
+        if feature in fixed:
+            go_right = fixed[feature] > crop_model.threshold[node]
+            stack.append(crop_model.children[2 * node + go_right])
+        else:
+            thresholds[feature].append(crop_model.threshold[node])
+            stack.extend((crop_model.children[2 * node], crop_model.children[2 * node + 1]))
+    return {f: np.unique(np.asarray(t, dtype=np.float32)) for f, t in thresholds.items()}
+
+
+def build_sms_table(crop_model, model_path=MODEL_PATH, out_path=DEFAULT_TABLE_PATH, chunk_size=65536):
+    """
+    Precompute the crop for every SMS keypad input and save it as a memory-mappable .npy.
+
+    Keypad values that fall between the same pair of reachable split thresholds always
+    reach the same leaves, so the table stores one uint8 class index per cell of that
+    partition plus small per-feature lookup arrays, instead of one entry per grid point.
+    """
+    if not isinstance(crop_model, CompiledForest):
+        raise ValueError("The SMS table can only be built for tree-based crop models.")
+    fixed_values = [advisor.SMS_DEFAULT_TEMPERATURE, advisor.SMS_DEFAULT_HUMIDITY, advisor.SMS_DEFAULT_RAINFALL]
+    fixed = dict(zip((3, 4, 6), np.asarray(fixed_values, dtype=np.float32)))
+    thresholds = _reachable_thresholds(crop_model, fixed)
+
+    lookups, representatives = [], []
+    for feature, grid in zip(SMS_FREE_FEATURES, _sms_grids()):
+        # A value goes left at threshold t iff value <= t, so the number of thresholds
+        # strictly below the value identifies its cell.
+        cells = np.searchsorted(thresholds[feature], grid, side='left')
+        _, first, lookup = np.unique(cells, return_index=True, return_inverse=True)
+        lookups.append(lookup.astype(np.int32))
+        representatives.append(grid[first])
+
+    shape = tuple(len(r) for r in representatives)
+    if len(crop_model.classes_) > 255:
+        raise ValueError("The SMS table stores class indices as uint8.")
+    table = np.lib.format.open_memmap(out_path + '.tmp.npy', mode='w+', dtype=np.uint8, shape=shape)
+    flat = table.reshape(-1)
+    class_index = {c: i for i, c in enumerate(crop_model.classes_)}
+    for start in range(0, flat.size, chunk_size):
+        idx = np.unravel_index(np.arange(start, min(start + chunk_size, flat.size)), shape)
+        X = np.empty((len(idx[0]), crop_model.n_features_in_), dtype=np.float32)
+        for feature, value in fixed.items():
+            X[:, feature] = value
+        for axis, feature in enumerate(SMS_FREE_FEATURES):
+            X[:, feature] = representatives[axis][idx[axis]]
+        crops = crop_model.predict(X)
+        flat[start:start + len(crops)] = [class_index[c] for c in crops]
+    table.flush()
+    del table, flat
+    os.replace(out_path + '.tmp.npy', out_path)
+    np.savez(
+        _meta_path(out_path),
+        n_lookup=lookups[0], p_lookup=lookups[1], k_lookup=lookups[2], ph_lookup=lookups[3],
+        classes=np.asarray(crop_model.classes_).astype(str), model_digest=np.array(model_digest(model_path)),
+    )
+    return shape
+
+
+class SMSTable:
+    """A memory-mapped precomputed SMS table; see build_sms_table."""
+
+    def __init__(self, path):
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+        with np.load(_meta_path(path)) as meta:
+            self.lookups = [meta['n_lookup'], meta['p_lookup'], meta['k_lookup'], meta['ph_lookup']]
+            self.classes = meta['classes']
+            self.model_digest = str(meta['model_digest'])
+
+    def lookup(self, key):
+        """Crop for a quantized key, or None when the key is outside the SMS grid."""
+        n, p, k, temp, hum, ph, rain = key
+        if (temp, hum, rain) != SMS_WEATHER_KEY:
+            return None
+        if not (0 <= n <= SMS_NPK_MAX and 0 <= p <= SMS_NPK_MAX and 0 <= k <= SMS_NPK_MAX and 0 <= ph <= SMS_PH_STEPS):
+            return None
+        cell = self.table[self.lookups[0][n], self.lookups[1][p], self.lookups[2][k], self.lookups[3][ph]]
+        return str(self.classes[cell])
+
+    def lookup_batch(self, keys):
+        """lookup for every row of an (n_rows, 7) array of quantized keys; '' where a key is outside the grid."""
+        n, p, k, temp, hum, ph, rain = np.asarray(keys).T
+        on_grid = (temp == SMS_WEATHER_KEY[0]) & (hum == SMS_WEATHER_KEY[1]) & (rain == SMS_WEATHER_KEY[2])
+        on_grid &= (np.minimum(np.minimum(n, p), np.minimum(k, ph)) >= 0) & (np.maximum(np.maximum(n, p), k) <= SMS_NPK_MAX) & (ph <= SMS_PH_STEPS)
+        crops = np.full(len(on_grid), '', dtype=object)
+        cells = self.table[self.lookups[0][n[on_grid]], self.lookups[1][p[on_grid]], self.lookups[2][k[on_grid]], self.lookups[3][ph[on_grid]]]
+        crops[on_grid] = self.classes.astype(object)[cells]
+        return crops
+
+
+def open_sms_table(table_path=DEFAULT_TABLE_PATH, model_path=MODEL_PATH):
+    """The SMS table at `table_path` if it exists and was built for the model at `model_path`, else None."""
+    if not table_path or not os.path.exists(table_path):
+        return None
+    table = SMSTable(table_path)
+    if table.model_digest != model_digest(model_path):
+        logger.warning("Ignoring %s: it was built for a different crop model.", table_path)
+        return None
+    return table
+
+
+class RecommendationCache:
+    """
+    Bounded LRU of crop predictions and fertilizer doses keyed by quantized inputs.
+
+    The model follows its file through a ReloadingModel (checked at most every
+    `check_interval` seconds, reloaded in the background). Once a new model is
+    swapped in the LRU is cleared and a precomputed table built for a different
+    model is dropped. Pass a ReloadingModel as `crop_model` to share one watcher.
+    Each LRU entry records the model version that predicted it, so a prediction that
+    finishes after the swap (e.g. a micro-batch scored by the old model) is never served.
+    """
+
+    def __init__(self, crop_model=None, model_path=MODEL_PATH, maxsize=DEFAULT_MAXSIZE, table_path=None, check_interval=1.0):
+        self.model_path = model_path
+        self.table_path = table_path
+        self.table = None
+        self.table_hits = 0
+        self.stale_hits = 0
+        self._lru = LRUCache(maxsize)
+        if isinstance(crop_model, ReloadingModel):
+            self._model = crop_model
+        else:
+            self._model = ReloadingModel(model_path, check_interval, model=crop_model)
+        self._model.on_reload(self._model_changed)
+        self._open_table()
+        metrics.register_cache('recommendation', self.stats)
+
+    @property
+    def crop_model(self):
+        return self._model.current()
+
+    @property
+    def model_version(self):
+        """Version of the model now serving; pass it to store() for predictions made after reading it."""
+        return self._model.version
+
+    @property
+    def reloads(self):
+        return self._model.reloads
+
+    def _open_table(self):
+        self.table = open_sms_table(self.table_path, self.model_path)
+
+    def _model_changed(self, model):
+        # Runs on the reload thread right after the swap.
+        self._lru.clear()
+        self._open_table()
+        logger.info("Recommendation cache invalidated for the new crop model.")
+
+    def predict(self, X):
+        """Predict with the current model, so callers that batch their misses follow reloads too."""
+        return self.crop_model.predict(X)
+
+    def lookup(self, features):
+        """Cached (crop, n_diff, rec_urea, rec_dap) for `features`, or None. Never calls the model."""
+        self._model.current()  # notice a changed model file before answering from the cache
+        key = quantize(features)
+        version, entry = self._lru.get(key, (None, None))
+        if entry is not None and version != self._model.version:
+            self.stale_hits += 1
+            entry = None
+        if entry is None and self.table is not None:
+            crop = self.table.lookup(key)
+            if crop is not None:
+                self.table_hits += 1
+                entry = self._entry(key, crop)
+        return entry
+
+    def store(self, features, crop, version=None):
+        """
+        Remember a crop predicted elsewhere (e.g. in a micro-batch) and return its entry.
+        `version` is model_version as read before the prediction; if the model has been
+        swapped since, the entry is returned but not cached. None means the current version.
+        """
+        key = quantize(features)
+        entry = self._entry(key, crop)
+        current = self._model.version
+        if version is None or version == current:
+            self._lru.put(key, (current if version is None else version, entry))
+        return entry
+
+    @staticmethod
+    def _entry(key, crop):
+        n_diff, rec_urea, rec_dap = advisor.fertilizer_doses(key[0], key[1])
+        return (str(crop), float(n_diff), float(rec_urea), float(rec_dap))
+
+    def recommend(self, features):
+        """(crop, n_diff, rec_urea, rec_dap) for `features`, predicting on a miss."""
+        version = self.model_version
+        entry = self.lookup(features)
+        if entry is None:
+            key = quantize(features)
+            crop = self.crop_model.predict([dequantize(key)])[0]
+            entry = self.store(features, crop, version)
+        return entry
+
+    def predict_crop_and_plan(self, features, lang):
+        crop, n_diff, rec_urea, rec_dap = self.recommend(features)
+        return advisor.build_crop_plan(crop, features, lang, doses=(n_diff, rec_urea, rec_dap))
+
+    def stats(self):
+        stats = self._lru.stats()
+        # Entries left by a previous model are LRU hits but answered as misses, and table
+        # hits follow an LRU miss; count each lookup once. Every term only grows, so the
+        # exported counters never go backwards.
+        hits = stats['hits'] - self.stale_hits + self.table_hits
+        misses = stats['misses'] + self.stale_hits - self.table_hits
+        stats.update({
+            'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'table_hits': self.table_hits, 'table_loaded': self.table is not None, 'model_reloads': self.reloads,
+        })
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed SMS recommendation table.")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--out', default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    shape = build_sms_table(load_model(args.model), args.model, args.out)
+    print(f"Built {args.out} with {np.prod(shape):,} cells {shape} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# scenarios.py
+# Monte Carlo profit and harvest-timing scenarios for many crops at once, in batched NumPy.
+#
+# Every simulated season draws a yield shock, a market price path and the first day of
+# heavy rain after the crop matures. All crops and harvest-delay options share the same
+# draws (common random numbers), so the differences between them are not sampling noise
+# and rankings are stable at modest simulation counts.
+#
+# Per crop, per harvest delay (days past maturity) and per simulated season:
+#   yield   lognormal around yield_per_acre with coefficient of variation yield_cv
+#   price   geometric Brownian motion from today's market_price_per_quintal, annual drift
+#           PRICE_DRIFT and volatility price_volatility. Prices sit HARVEST_GLUT below
+#           trend when the crop matures and recover over GLUT_RECOVERY_DAYS.
+#   losses  heavy rain on any day the mature crop is still in the field destroys a
+#           RAIN_LOSS fraction of it, and each day past maturity loses decay_per_day
+
+import numpy as np
+
+DEFAULT_DELAYS = (0, 7, 14, 21)
+DEFAULT_SIMULATIONS = 20_000
+PERCENTILES = (5, 50, 95)
+# Share of seasons whose worst outcomes make up the conditional value at risk.
+TAIL = 0.05
+
+PRICE_DRIFT = 0.05
+HARVEST_GLUT, GLUT_RECOVERY_DAYS = 0.08, 10.0
+RAIN_PROBABILITY_PER_DAY = 0.03
+RAIN_LOSS = (0.05, 0.25)
+
+# Used for crops whose entry in the knowledge base leaves these out.
+DEFAULTS = {'maturity_days': 100, 'cost_per_acre': 0.0, 'yield_cv': 0.25, 'price_volatility': 0.25, 'decay_per_day': 0.002}
+
+
+def _crop_params(crop_data, crops):
+    return {field: np.array([crop_data[c].get(field, DEFAULTS.get(field)) for c in crops], dtype=np.float64)
+            for field in ('yield_per_acre', 'market_price_per_quintal', *DEFAULTS)}
+
+
+def simulate(crop_data, crops=None, delays=DEFAULT_DELAYS, n_sims=DEFAULT_SIMULATIONS, days_since_sowing=0, seed=0):
+    """
+    Simulated revenue per acre for `crops` (default: all of `crop_data`) if harvested each
+    of `delays` days after maturity, for a crop sown `days_since_sowing` days ago.
+    Returns (crops, revenue, cost): revenue is float32 of shape (crops, delays, n_sims)
+    and cost the per-acre cost of each crop, so profit is revenue - cost[:, None, None].
+    """
+    crops = list(crop_data) if crops is None else list(crops)
+    params = _crop_params(crop_data, crops)
+    delays = np.asarray(delays, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+
+    # Days already spent past maturity (overdue crops) plus the delay being evaluated.
+    overdue = np.maximum(days_since_sowing - params['maturity_days'], 0)
+    days_past_maturity = overdue[:, None] + delays[None, :]
+    # Years from today until the first harvest option; later options extend the same price path.
+    to_maturity = np.maximum(params['maturity_days'] - days_since_sowing, 0) / 365.0
+
+    price_shocks = rng.standard_normal((len(delays), n_sims), dtype=np.float32)
+    yield_shocks = rng.standard_normal(n_sims, dtype=np.float32)
+    first_rain_day = rng.geometric(RAIN_PROBABILITY_PER_DAY, n_sims)
+    rain_loss = rng.uniform(*RAIN_LOSS, n_sims).astype(np.float32)
+
+    # Everything is summed in log space and exponentiated once. Terms shared by all crops
+    # (the price path after maturity, rain) and per-crop terms (the path up to maturity,
+    # the yield shock, trends) are built on the small arrays and broadcast in one pass each.
+    vol = params['price_volatility']
+    sigma = np.sqrt(np.log1p(params['yield_cv'] ** 2))
+    after_maturity = np.cumsum(np.sqrt(np.diff(delays, prepend=0.0) / 365.0).astype(np.float32)[:, None] * price_shocks, axis=0)
+    rained = first_rain_day[None, :] <= delays[:, None]
+    rain = np.where(rained, np.log1p(-rain_loss)[None, :], np.float32(0))
+    per_crop = ((vol * np.sqrt(to_maturity)).astype(np.float32)[:, None] * price_shocks[0]
+                + sigma.astype(np.float32)[:, None] * yield_shocks)
+    log_trend = (np.log(params['market_price_per_quintal'] * params['yield_per_acre'])[:, None] - (sigma ** 2 / 2)[:, None]
+                 + (PRICE_DRIFT - vol ** 2 / 2)[:, None] * (to_maturity[:, None] + delays[None, :] / 365.0)
+                 + np.log1p(-HARVEST_GLUT * np.exp(-days_past_maturity / GLUT_RECOVERY_DAYS))
+                 + days_past_maturity * np.log1p(-params['decay_per_day'])[:, None])
+
+    revenue = vol.astype(np.float32)[:, None, None] * after_maturity[None, :, :]
+    revenue += per_crop[:, None, :]
+    revenue += rain[None, :, :]
+    revenue += log_trend.astype(np.float32)[:, :, None]
+    np.exp(revenue, out=revenue)
+    return crops, revenue, params['cost_per_acre']
+
+
+def summarize(crops, revenue, cost, delays=DEFAULT_DELAYS):
+    """One row per crop and delay: expected values, revenue percentiles and downside risk."""
+    n_sims = revenue.shape[-1]
+    tail = max(int(n_sims * TAIL), 1)
+    ranks = [round(q / 100 * (n_sims - 1)) for q in PERCENTILES]
+    # Profit is revenue minus a per-crop constant, so one sort of revenue gives the
+    # percentiles and the worst-tail seasons of both (a full sort beats several partitions).
+    ordered = np.sort(revenue, axis=-1)
+    expected_revenue = revenue.mean(axis=-1, dtype=np.float64)
+    worst_revenue = ordered[..., :tail].mean(axis=-1, dtype=np.float64)
+    loss_probability = (revenue < cost.astype(np.float32)[:, None, None]).mean(axis=-1)
+    rows = []
+    for i, crop in enumerate(crops):
+        for j, delay in enumerate(delays):
+            row = {'crop': crop, 'delay_days': int(delay),
+                   'expected_revenue': float(expected_revenue[i, j]), 'expected_profit': float(expected_revenue[i, j] - cost[i])}
+            row.update({f'revenue_p{q}': float(ordered[i, j, k]) for q, k in zip(PERCENTILES, ranks)})
+            row['loss_probability'] = float(loss_probability[i, j])
+            row[f'profit_worst_{int(TAIL * 100)}pct'] = float(worst_revenue[i, j] - cost[i])
+            rows.append(row)
+    return rows
+
+
+def scenario_table(crop_data, crops=None, delays=DEFAULT_DELAYS, n_sims=DEFAULT_SIMULATIONS, days_since_sowing=0, seed=0):
+    """simulate() + summarize(): the table the Profit and Harvest tabs show."""
+    return summarize(*simulate(crop_data, crops, delays, n_sims, days_since_sowing, seed), delays=delays)
+
+
+def best_delays(rows):
+    """Each crop's row with the highest expected profit, best crop first."""
+    best = {}
+    for row in rows:
+        if row['crop'] not in best or row['expected_profit'] > best[row['crop']]['expected_profit']:
+            best[row['crop']] = row
+    return sorted(best.values(), key=lambda row: row['expected_profit'], reverse=True)
+
+
+def expected_price_change(crop_info, days_since_sowing, delay):
+    """Expected relative price change from selling at maturity to selling `delay` days later."""
+    maturity = crop_info.get('maturity_days', DEFAULTS['maturity_days'])
+    overdue = max(days_since_sowing - maturity, 0)
+    glut = lambda days: 1 - HARVEST_GLUT * np.exp(-days / GLUT_RECOVERY_DAYS)
+    return float(np.exp(PRICE_DRIFT * delay / 365.0) * glut(overdue + delay) / glut(overdue) - 1)
+
+
+def rain_probability(days):
+    """Chance of at least one heavy-rain day within `days` days."""
+    return 1 - (1 - RAIN_PROBABILITY_PER_DAY) ** days
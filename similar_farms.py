@@ -0,0 +1,153 @@
+# similar_farms.py
+# "Farms like yours": the training samples nearest to a soil test, to explain a recommendation.
+#
+# A KD-tree over the seven model features, each scaled to unit variance so that rainfall
+# in mm does not drown out pH. The index is built from Crop_recommendation.csv (or the
+# observation store as it grows) and saved next to crop_model.pkl together with a digest
+# of its source, so one built from the CSV is rebuilt only when the CSV changes. One built
+# from the store is kept until the next `build --store`.
+#
+# Usage: python similar_farms.py build [--store observations]
+#        python similar_farms.py query 90 42 43 20.8 82 6.5 202.9 [-k 5]
+
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+import metrics
+from advisor import FEATURE_COLUMNS
+from crop_engine import file_digest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ROOT, 'Crop_recommendation.csv')
+INDEX_PATH = os.path.join(ROOT, 'similar_farms.index')
+DEFAULT_K = 5
+# Points per KD-tree leaf; larger leaves build faster, smaller ones query a little faster.
+LEAF_SIZE = 16
+
+
+class SimilarFarmsIndex:
+    """KD-tree over scaled soil/weather features with the crop grown on each sample."""
+
+    def __init__(self, tree, mean, scale, classes, codes, source_digest=None):
+        self.tree, self.mean, self.scale = tree, mean, scale
+        self.classes, self.codes = classes, codes
+        self.source_digest = source_digest
+
+    def __len__(self):
+        return self.tree.n
+
+    @classmethod
+    def build(cls, X, labels, source_digest=None):
+        X = np.asarray(X, dtype=np.float64)
+        mean, scale = X.mean(axis=0), X.std(axis=0)
+        scale[scale == 0] = 1.0
+        classes, codes = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+        codes = codes.astype(np.uint8 if len(classes) <= 256 else np.int32)
+        tree = cKDTree((X - mean) / scale, leafsize=LEAF_SIZE, balanced_tree=False)
+        return cls(tree, mean, scale, classes, codes, source_digest)
+
+    @classmethod
+    def from_csv(cls, path=DATASET_PATH):
+        df = pd.read_csv(path)
+        return cls.build(df[FEATURE_COLUMNS].to_numpy(), df['label'].to_numpy(), source_digest=file_digest(path))
+
+    @classmethod
+    def from_store(cls, store):
+        """Index every row of an observation_store.ObservationStore."""
+        X, y = store.read()
+        return cls.build(X, y, source_digest=f"store:{store.n_rows}")
+
+    def save(self, path=INDEX_PATH):
+        # Plain state rather than the object, so the file does not depend on where this class was imported from.
+        tmp_path = f"{path}.tmp"
+        joblib.dump(vars(self), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        return cls(**joblib.load(path))
+
+    def query_batch(self, X, k=DEFAULT_K):
+        """
+        The k nearest samples for each row of X. Returns (distances, rows, crops), each of
+        shape (len(X), k): distance in scaled units, row number in the index, crop name.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+        k = min(k, len(self))
+        distances, rows = self.tree.query((X - self.mean) / self.scale, k=k, workers=-1 if len(X) > 256 else 1)
+        distances, rows = distances.reshape(len(X), k), rows.reshape(len(X), k)
+        return distances, rows, self.classes[self.codes[rows]]
+
+    @metrics.timed
+    def query(self, features, k=DEFAULT_K):
+        """The k samples most similar to one soil test, nearest first, as dicts with the crop grown."""
+        distances, rows, crops = self.query_batch([features], k)
+        samples = self.tree.data[rows[0]] * self.scale + self.mean
+        return [dict(zip(FEATURE_COLUMNS, np.round(sample, 2).tolist()), crop=str(crop), distance=float(distance))
+                for sample, crop, distance in zip(samples, crops[0], distances[0])]
+
+    def crop_votes(self, features, k=DEFAULT_K):
+        """How many of the k most similar samples grew each crop, most common first."""
+        _, _, crops = self.query_batch([features], k)
+        names, counts = np.unique(crops[0], return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return {str(names[i]): int(counts[i]) for i in order}
+
+
+def load_index(path=INDEX_PATH, dataset=DATASET_PATH):
+    """
+    The saved index if it was built from the observation store or from the current
+    `dataset`, otherwise a freshly built one (saved for next time). Pass dataset=None
+    to use the saved index as-is.
+    """
+    start = time.perf_counter()
+    index = None
+    if os.path.exists(path):
+        index = SimilarFarmsIndex.load(path)
+        from_store = str(index.source_digest).startswith('store:')
+        if dataset is not None and not from_store and index.source_digest != file_digest(dataset):
+            index = None
+    if index is None:
+        if dataset is None:
+            raise FileNotFoundError(f"No similar-farms index at {path}; run `python similar_farms.py build`.")
+        index = SimilarFarmsIndex.from_csv(dataset)
+        index.save(path)
+    metrics.model_loaded('similar_farms', time.perf_counter() - start)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the similar-farms index.")
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('features', nargs='*', type=float, help="N P K temperature humidity ph rainfall (query).")
+    parser.add_argument('-k', type=int, default=DEFAULT_K)
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--store', help="Build from an observation store instead of the dataset CSV.")
+    parser.add_argument('--index', default=INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        if args.store:
+            from observation_store import ObservationStore
+            index = SimilarFarmsIndex.from_store(ObservationStore(args.store))
+        else:
+            index = SimilarFarmsIndex.from_csv(args.dataset)
+        index.save(args.index)
+        print(f"Indexed {len(index)} samples in {time.perf_counter() - start:.2f} s -> {args.index}")
+    else:
+        if len(args.features) != len(FEATURE_COLUMNS):
+            parser.error(f"query needs {len(FEATURE_COLUMNS)} values: {' '.join(FEATURE_COLUMNS)}")
+        index = load_index(args.index, args.dataset)
+        for sample in index.query(args.features, args.k):
+            print(sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# sms_campaign.py
+# Seasonal SMS advisories for a whole district: farmer roster CSV in, SMS-gateway upload files out.
+#
+# The roster is streamed in chunks. Each chunk is scored in one vectorized step (keypad
+# soil tests are looked up in the precomputed SMS table when there is one, the rest go
+# through one model call) and its messages are rendered column-wise from the language's
+# SMS template, compiled once per language. Memory stays bounded by the chunk size
+# however long the roster.
+# Messages are the ones the SMS tab shows (advisor.sms_message), as plain text without its markdown.
+#
+# Roster columns: phone, lang (or language; blank means --language), N, P, K, ph, and
+# optionally temperature, humidity and rainfall (the SMS defaults are used when absent).
+# Output: <out_dir>/sms_0001.csv, sms_0002.csv, ... with phone (+91...), lang and
+# message, at most --rows-per-file rows each, and rejected.csv for rows that could not
+# be messaged (bad phone number or soil test) with the reason.
+#
+# Usage: python sms_campaign.py roster.csv campaign/ [--chunksize 50000] [--rows-per-file 100000] [--language kn]
+
+import argparse
+import os
+import string
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import advisor
+import localization
+import metrics
+from advisor import FEATURE_COLUMNS, SMS_DEFAULT_HUMIDITY, SMS_DEFAULT_RAINFALL, SMS_DEFAULT_TEMPERATURE, normalize_columns, scoreable_rows
+from recommendation_cache import dequantize_batch, quantize_batch
+
+# Roster rows read, scored and written per step.
+DEFAULT_CHUNKSIZE = 50_000
+# Rows per gateway upload file.
+DEFAULT_ROWS_PER_FILE = 100_000
+# Weather columns an SMS soil test usually lacks, filled as the SMS service fills them.
+SMS_WEATHER_DEFAULTS = {'temperature': SMS_DEFAULT_TEMPERATURE, 'humidity': SMS_DEFAULT_HUMIDITY, 'rainfall': SMS_DEFAULT_RAINFALL}
+REQUIRED_COLUMNS = ['phone', 'N', 'P', 'K', 'ph']
+
+
+def compile_template(template):
+    """Split a str.format template once into (literal, field, format_spec) parts for render_template."""
+    return [(literal, field, spec) for literal, field, spec, _ in string.Formatter().parse(template)]
+
+
+def render_template(parts, n, **columns):
+    """Render `n` messages at once; each field is filled from the equally long array in `columns`."""
+    out = np.full(n, '', dtype=object)
+    for literal, field, spec in parts:
+        if literal:
+            out = out + literal
+        if field is not None:
+            values = np.asarray(columns[field], dtype=object)
+            out = out + (np.array([format(v, spec) for v in values], dtype=object) if spec else values.astype(str).astype(object))
+    return out
+
+
+_templates = {}
+
+
+def sms_template(lang):
+    """Compiled plain-text SMS template for `lang`, falling back to English as advisor.sms_message does."""
+    parts = _templates.get(lang)
+    if parts is None:
+        parts = _templates[lang] = compile_template(advisor.sms_template(lang, markdown=False))
+    return parts
+
+
+def normalize_phones(phones):
+    """10-digit Indian mobile numbers from roster entries like '98765 43210' or '+91-9876543210'; '' if invalid."""
+    digits = phones.fillna('').astype(str).str.replace(r'\D', '', regex=True)
+    digits = digits.where(~((digits.str.len() == 12) & digits.str.startswith('91')), digits.str[2:])
+    valid = (digits.str.len() == 10) & digits.str[0].isin(list('6789'))
+    return digits.where(valid, '')
+
+
+def _text_columns(source):
+    """dtype for read_csv: the phone and language columns as text, however their headers are spelled."""
+    start = source.tell() if hasattr(source, 'tell') else None
+    header = pd.read_csv(source, nrows=0).columns
+    if start is not None:
+        source.seek(start)
+    return {col: str for col in header if col.strip().lower() in ('phone', 'lang', 'language')}
+
+
+def read_roster(source, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield the roster at `source` (path or seekable file object) as normalized DataFrame chunks."""
+    # Read as numbers, phone numbers would lose their format and become floats in chunks with a blank cell.
+    for chunk in pd.read_csv(source, chunksize=chunksize, dtype=_text_columns(source)):
+        yield normalize_columns(chunk, FEATURE_COLUMNS + ['phone', 'lang'], REQUIRED_COLUMNS, {'language': 'lang'}, "Roster")
+
+
+@metrics.timed
+def campaign_chunk(crop_model, chunk, default_language='en', table=None):
+    """
+    Score and render one roster chunk. Returns (messages, rejected) DataFrames.
+    `table` is an optional recommendation_cache.SMSTable built for `crop_model`.
+    """
+    phones = normalize_phones(chunk['phone']).to_numpy()
+    langs = chunk['lang'] if 'lang' in chunk.columns else pd.Series('', index=chunk.index)
+    langs = langs.fillna('').astype(str).str.strip().str.lower().replace('', default_language)
+    langs = langs.where(langs.isin(localization.languages()), localization.DEFAULT_LANGUAGE).to_numpy()
+
+    features = pd.DataFrame({col: pd.to_numeric(chunk[col], errors='coerce') if col in chunk.columns else np.nan
+                             for col in FEATURE_COLUMNS}, index=chunk.index).fillna(SMS_WEATHER_DEFAULTS)
+    # Infinite values and numbers too large for the model's float32 inputs are as unusable as blanks.
+    bad_soil = ~scoreable_rows(features)
+    bad_phone = phones == ''
+    ok = ~(bad_soil | bad_phone)
+
+    X = features.to_numpy()[ok]
+    crops = np.full(len(X), '', dtype=object)
+    if table is not None:
+        # The table answers for quantized inputs; use it only where quantizing changes nothing,
+        # so every message is the one predicting on the roster row itself would give.
+        keys = quantize_batch(X)
+        exact = (dequantize_batch(keys) == X).all(axis=1)
+        crops[exact] = table.lookup_batch(keys[exact])
+    misses = crops == ''
+    if misses.any():
+        crops[misses] = crop_model.predict(X[misses])
+    phones, langs = phones[ok], langs[ok]
+    messages = np.empty(len(X), dtype=object)
+    for lang in localization.languages():
+        group = langs == lang
+        if group.any():
+            messages[group] = render_template(sms_template(lang), int(group.sum()), phone=phones[group], crop_name=crops[group])
+    sent = pd.DataFrame({'phone': '+91' + phones.astype(object), 'lang': langs, 'message': messages})
+
+    reasons = np.where(bad_phone, 'invalid phone number', 'invalid soil test')[~ok]
+    # pandas numbers rows across chunks, so `row` is the data row in the whole roster, from 1.
+    rejected = pd.DataFrame({'row': chunk.index[~ok] + 1, 'phone': chunk['phone'].to_numpy()[~ok], 'reason': reasons})
+    return sent, rejected
+
+
+def _csv_text(frame):
+    """Rows of a messages frame as CSV. Phone numbers and language codes never need quoting, so only messages are quoted."""
+    messages = frame['message']
+    if messages.str.contains('"', regex=False).any():
+        messages = messages.str.replace('"', '""', regex=False)
+    return ''.join(frame['phone'].to_numpy(dtype=object) + ',' + frame['lang'].to_numpy(dtype=object) + ',"' + messages.to_numpy(dtype=object) + '"\n')
+
+
+class _FileRotator:
+    """Append DataFrames to out_dir/sms_0001.csv, sms_0002.csv, ..., at most `rows_per_file` rows each."""
+
+    def __init__(self, out_dir, rows_per_file):
+        self.out_dir, self.rows_per_file = out_dir, rows_per_file
+        self.files, self._rows_in_file = [], 0
+
+    def write(self, frame):
+        while len(frame):
+            if not self.files or self._rows_in_file >= self.rows_per_file:
+                self.files.append(os.path.join(self.out_dir, f"sms_{len(self.files) + 1:04d}.csv"))
+                self._rows_in_file = 0
+            part, frame = frame.iloc[:self.rows_per_file - self._rows_in_file], frame.iloc[self.rows_per_file - self._rows_in_file:]
+            new_file = self._rows_in_file == 0
+            with open(self.files[-1], 'w' if new_file else 'a', encoding='utf-8', newline='') as f:
+                f.write(('phone,lang,message\n' if new_file else '') + _csv_text(part))
+            self._rows_in_file += len(part)
+
+
+def run_campaign(crop_model, source, out_dir, chunksize=DEFAULT_CHUNKSIZE, rows_per_file=DEFAULT_ROWS_PER_FILE,
+                 default_language='en', table=None, progress=None):
+    """
+    Stream the roster at `source` into gateway files under `out_dir`, using the SMS `table`
+    if one is given (see campaign_chunk). `progress`, if given, is called with the running
+    stats after every chunk. Returns the final stats: rows read, sent and rejected, output
+    files, elapsed seconds, rows per second and seconds per stage.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = _FileRotator(out_dir, rows_per_file)
+    rejected_path = os.path.join(out_dir, 'rejected.csv')
+    stats = {'rows': 0, 'sent': 0, 'rejected': 0, 'files': files.files, 'seconds': 0.0, 'rows_per_s': 0.0,
+             'stages': {'read': 0.0, 'score': 0.0, 'write': 0.0}}
+    start = last = time.perf_counter()
+    pd.DataFrame(columns=['row', 'phone', 'reason']).to_csv(rejected_path, index=False)
+    for chunk in read_roster(source, chunksize):
+        read = time.perf_counter()
+        sent, rejected = campaign_chunk(crop_model, chunk, default_language, table)
+        scored = time.perf_counter()
+        files.write(sent)
+        if len(rejected):
+            rejected.to_csv(rejected_path, mode='a', header=False, index=False)
+        now = time.perf_counter()
+
+        stages = stats['stages']
+        stages['read'] += read - last
+        stages['score'] += scored - read
+        stages['write'] += now - scored
+        last = now
+        stats['rows'] += len(chunk)
+        stats['sent'] += len(sent)
+        stats['rejected'] += len(rejected)
+        stats['seconds'] = now - start
+        stats['rows_per_s'] = stats['rows'] / stats['seconds']
+        if progress:
+            progress(stats)
+    return stats
+
+
+def main():
+    from crop_engine import MODEL_PATH, load_model
+    from recommendation_cache import DEFAULT_TABLE_PATH, open_sms_table
+
+    parser = argparse.ArgumentParser(description="Generate SMS-gateway files for a farmer roster.")
+    parser.add_argument('roster', help="CSV with phone, lang, N, P, K and ph columns (temperature, humidity, rainfall optional).")
+    parser.add_argument('out_dir')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--rows-per-file', type=int, default=DEFAULT_ROWS_PER_FILE)
+    parser.add_argument('--language', default='en', help="Language for roster rows without one.")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--table', default=DEFAULT_TABLE_PATH, help="Precomputed SMS table; ignored if missing or built for another model.")
+    args = parser.parse_args()
+
+    # A bulk run: keep the scikit-learn estimator, which scores large chunks faster.
+    crop_model = load_model(args.model, keep_estimator=True)
+    table = open_sms_table(args.table, args.model)
+
+    def progress(stats):
+        print(f"\r{stats['rows']:>12,} rows  {stats['rows_per_s']:>9,.0f} rows/s", end='', file=sys.stderr, flush=True)
+
+    stats = run_campaign(crop_model, args.roster, args.out_dir, args.chunksize, args.rows_per_file, args.language, table, progress)
+    print(file=sys.stderr)
+    stages = ', '.join(f"{name} {seconds:.1f} s" for name, seconds in stats['stages'].items())
+    print(f"{stats['sent']:,} messages in {len(stats['files'])} files, {stats['rejected']:,} rejected -> {args.out_dir}")
+    print(f"{stats['rows']:,} rows in {stats['seconds']:.1f} s ({stats['rows_per_s']:,.0f} rows/s; {stages})")
+
+
+if __name__ == '__main__':
+    main()
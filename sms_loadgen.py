@@ -0,0 +1,89 @@
+# sms_loadgen.py
+# Load generator for sms_service.py: fires concurrent /recommend requests over
+# keep-alive connections and reports latency percentiles and throughput.
+#
+# Usage: python sms_loadgen.py [--port 8080] [--concurrency 64] [--requests 5000]
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+
+def random_sms_request(rng):
+    """A soil test as a keypad farmer would send it: integer N/P/K, 0.1-step pH."""
+    return {
+        'phone': f"9{rng.randrange(10**9):09d}",
+        'N': rng.randint(0, 140), 'P': rng.randint(5, 145), 'K': rng.randint(5, 205),
+        'ph': round(rng.uniform(3.5, 9.9), 1),
+        'lang': rng.choice(['en', 'kn', 'hi']),
+    }
+
+
+async def _client(host, port, path, jobs, latencies, errors, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while jobs:
+            jobs.pop()
+            body = json.dumps(random_sms_request(rng)).encode('utf-8')
+            request = (
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode('latin-1') + body
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, path='/recommend', concurrency=64, requests=5000, seed=0):
+    """Send `requests` requests from `concurrency` connections. Returns a summary dict."""
+    jobs = list(range(requests))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, path, jobs, latencies, errors, seed + i) for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'elapsed_s': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        'p99_ms': float(np.percentile(ms, 99)) if len(ms) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a local SmartAgro SMS service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--path', default='/recommend')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args.host, args.port, args.path, args.concurrency, args.requests))
+    print(f"{summary['requests']} requests ({summary['errors']} errors) in {summary['elapsed_s']:.2f} s")
+    print(f"throughput: {summary['rps']:.0f} req/s   p50: {summary['p50_ms']:.2f} ms   p99: {summary['p99_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+# sms_service.py
+# Headless recommendation service for the SMS/IVR gateway.
+#
+# A plain asyncio HTTP/1.1 server (no Streamlit, no extra dependencies). Concurrent
+# /recommend requests are gathered into micro-batches so each model call scores many
+# farmers at once.
+#
+# Usage: python sms_service.py [--port 8080] [--max-batch-size 64] [--max-wait-ms 5] [--cache-size 8192]
+#
+#   POST /recommend  {"phone": "9988776655", "N": 90, "P": 42, "K": 43, "ph": 6.5, "lang": "en"}
+#   POST /water      {"soil_type": "Sandy Soil", "lang": "en"}
+#   POST /harvest    {"crop": "rice", "sowing_date": "2025-06-01", "lang": "en"}
+#   GET  /health     liveness and batching statistics
+#   GET  /metrics    Prometheus text metrics
+
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+
+import advisor
+import metrics
+from crop_engine import MODEL_PATH, ReloadingModel, load_model
+from recommendation_cache import DEFAULT_MAXSIZE, DEFAULT_TABLE_PATH, RecommendationCache, dequantize, quantize
+
+logger = logging.getLogger("smartagro.sms_service")
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+MAX_BODY_BYTES = 64 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class BadRequest(Exception):
+    """Raised for client errors; the message is returned to the caller."""
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent predict requests and scores them together.
+
+    A batch is flushed as soon as it holds `max_batch_size` rows, or `max_wait`
+    seconds after its first row arrived, whichever comes first. Model calls run
+    on a single worker thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(self, crop_model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_MS / 1000):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.crop_model = crop_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crop-model")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def predict(self, features):
+        """Queue one feature row and wait for its predicted crop."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            X = np.array([features for features, _ in batch], dtype=np.float64)
+            try:
+                with metrics.track('sms_service.batch_predict'):
+                    crops = await loop.run_in_executor(self._executor, self.crop_model.predict, X)
+            except Exception:
+                logger.exception("Batch prediction failed; scoring its %d rows one by one", len(batch))
+                await self._run_one_by_one(batch)
+                continue
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), crop in zip(batch, crops):
+                if not future.done():
+                    future.set_result(str(crop))
+
+
+    async def _run_one_by_one(self, batch):
+        """Score a failed batch row by row, so a bad row fails only its own request."""
+        loop = asyncio.get_running_loop()
+        for features, future in batch:
+            try:
+                crop = (await loop.run_in_executor(self._executor, self.crop_model.predict, np.array([features], dtype=np.float64)))[0]
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.rows += 1
+            if not future.done():
+                future.set_result(str(crop))
+
+
+def _number(payload, key, default=None):
+    value = payload.get(key, default)
+    if value is None:
+        raise BadRequest(f"Missing field: {key}")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"Field {key} must be a number")
+    if not np.isfinite(value):
+        raise BadRequest(f"Field {key} must be finite")
+    # The model scores float32 inputs; anything larger would fail the whole micro-batch.
+    if abs(value) > advisor.FLOAT32_MAX:
+        raise BadRequest(f"Field {key} is out of range")
+    return value
+
+
+class RecommendationService:
+    """
+    HTTP front end wrapping the advisor functions and a MicroBatcher. With a
+    RecommendationCache, repeated inputs are answered without touching the model
+    and only cache misses are batched.
+    """
+
+    def __init__(self, crop_model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_MS / 1000, cache=None):
+        self.cache = cache
+        self.batcher = MicroBatcher(cache if cache is not None else crop_model, max_batch_size, max_wait)
+        self.requests = 0
+        self.routes = {
+            ('POST', '/recommend'): self.recommend,
+            ('POST', '/water'): self.water,
+            ('POST', '/harvest'): self.harvest,
+            ('GET', '/health'): self.health,
+            ('GET', '/metrics'): self.prometheus,
+        }
+
+    async def recommend(self, payload):
+        lang = payload.get('lang', 'en')
+        features = [
+            _number(payload, 'N'), _number(payload, 'P'), _number(payload, 'K'),
+            _number(payload, 'temperature', advisor.SMS_DEFAULT_TEMPERATURE),
+            _number(payload, 'humidity', advisor.SMS_DEFAULT_HUMIDITY),
+            _number(payload, 'ph'),
+            _number(payload, 'rainfall', advisor.SMS_DEFAULT_RAINFALL),
+        ]
+        if self.cache is not None:
+            features = dequantize(quantize(features))
+            # Read before the batch runs: if the model is swapped meanwhile, store() won't cache the old model's answer.
+            version = self.cache.model_version
+            entry = self.cache.lookup(features)
+            if entry is None:
+                entry = self.cache.store(features, await self.batcher.predict(features), version)
+            crop, *doses = entry
+            result = advisor.build_crop_plan(crop, features, lang, doses=doses)
+        else:
+            crop = await self.batcher.predict(features)
+            result = advisor.build_crop_plan(crop, features, lang)
+        phone = payload.get('phone')
+        if phone:
+            result['sms'] = advisor.sms_message(phone, crop, lang, markdown=False)
+        return result
+
+    async def water(self, payload):
+        soil_type = payload.get('soil_type')
+        if not soil_type:
+            raise BadRequest("Missing field: soil_type")
+        return advisor.get_watering_advice(soil_type, payload.get('lang', 'en'))
+
+    async def harvest(self, payload):
+        crop = payload.get('crop')
+        if not crop:
+            raise BadRequest("Missing field: crop")
+        try:
+            sowing_date = date.fromisoformat(payload.get('sowing_date', ''))
+        except (TypeError, ValueError):
+            raise BadRequest("Field sowing_date must be an ISO date (YYYY-MM-DD)")
+        return advisor.get_harvest_advice(crop, sowing_date, payload.get('lang', 'en'))
+
+    async def health(self, payload):
+        batches = self.batcher.batches
+        health = {
+            'status': 'ok',
+            'requests': self.requests,
+            'batches': batches,
+            'mean_batch_size': round(self.batcher.rows / batches, 2) if batches else 0.0,
+        }
+        if self.cache is not None:
+            health['cache'] = self.cache.stats()
+        return health
+
+    async def prometheus(self, payload):
+        # A str result is sent as text/plain rather than JSON.
+        return metrics.render()
+
+    async def dispatch(self, method, path, body):
+        path = path.split('?', 1)[0]
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known_path = any(route_path == path for _, route_path in self.routes)
+            return (405 if known_path else 404), {'error': f"No route for {method} {path}"}
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise BadRequest("Request body must be a JSON object")
+        except json.JSONDecodeError:
+            return 400, {'error': "Request body is not valid JSON"}
+        except BadRequest as e:
+            return 400, {'error': str(e)}
+        try:
+            with metrics.track(f"sms_service.{handler.__name__}"):
+                return 200, await handler(payload)
+        except BadRequest as e:
+            return 400, {'error': str(e)}
+        except Exception:
+            logger.exception("Request to %s failed", path)
+            return 500, {'error': "Internal server error"}
+
+    async def handle_connection(self, reader, writer):
+        """Serve keep-alive HTTP/1.1 requests on one connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = request_line.split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                length = headers.get('content-length', '') or '0'
+                if not length.isascii() or not length.isdigit():
+                    await self._respond(writer, 400, {'error': "Invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests += 1
+                status, result = await self.dispatch(method.upper(), path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                await self._respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, result, keep_alive):
+        if isinstance(result, str):
+            body, content_type = result.encode('utf-8'), metrics.CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(result, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host=None, port=None, sock=None):
+        """Listen on host:port, or on an already bound `sock` (e.g. one shared by preforked workers)."""
+        await self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, sock=sock)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        logger.info("SmartAgro SMS service listening on %s (max batch %d, max wait %.1f ms)",
+                    addresses, self.batcher.max_batch_size, self.batcher.max_wait * 1000)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartAgro recommendation service for the SMS/IVR gateway.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Largest number of requests scored in one model call.")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS, help="Longest a request waits for its batch to fill.")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAXSIZE, help="Recommendation cache entries; 0 disables caching.")
+    parser.add_argument('--sms-table', default=DEFAULT_TABLE_PATH, help="Precomputed SMS table used when present.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Follows the file whether or not there is a cache (the cache shares this watcher).
+    crop_model = ReloadingModel(args.model, model=load_model(args.model))
+    cache = None
+    if args.cache_size > 0:
+        cache = RecommendationCache(crop_model, args.model, args.cache_size, table_path=args.sms_table)
+    service = RecommendationService(crop_model, args.max_batch_size, args.max_wait_ms / 1000, cache=cache)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from observation_store import ObservationStore  # noqa: E402
+
+GOOD = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9, 'label': 'rice'}
+
+
+def test_append_drops_rows_the_model_cannot_score(tmp_path):
+    store = ObservationStore(str(tmp_path / 'observations'))
+    rows = [GOOD, dict(GOOD, N=np.inf), dict(GOOD, P=-np.inf), dict(GOOD, rainfall=1e300),
+            dict(GOOD, K=None), dict(GOOD, ph='acidic'), dict(GOOD, label=''), dict(GOOD, label='maize')]
+
+    assert store.append(pd.DataFrame(rows)) == 2
+
+    X, y = store.read()
+    assert np.isfinite(X).all()
+    assert list(y) == ['rice', 'maize']
@@ -0,0 +1,185 @@
+# train_variants.py
+# Sweeps crop-model variants for latency- and size-constrained deployments.
+#
+# Candidates are trained in a process pool; each one is then measured one at a time
+# (so timings don't compete for cores) for accuracy, file size, load time and
+# single-row / batch predict latency, exactly as the app loads and serves it.
+# A Pareto report is written and the chosen model can be exported to crop_model.pkl.
+#
+# Usage: python train_variants.py [--workers 4] [--max-accuracy-drop 0.5] [--max-size-kb 500] [--export]
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from crop_engine import MODEL_PATH, load_model
+from train_crop_model import load_dataset, save_model
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_sweep')
+
+FOREST_GRID = {
+    'n_estimators': [10, 25, 50, 100],
+    'max_depth': [None, 8, 12],
+    'min_samples_leaf': [1, 2, 5],
+}
+
+
+def candidate_specs():
+    """(name, estimator) pairs to train: the forest grid plus a few compact alternatives."""
+    specs = []
+    for n_estimators, max_depth, min_samples_leaf in itertools.product(*FOREST_GRID.values()):
+        params = dict(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42)
+        specs.append((f"rf-{n_estimators}-d{max_depth or 'full'}-l{min_samples_leaf}", RandomForestClassifier(**params)))
+    for n_estimators in (25, 50):
+        specs.append((f"et-{n_estimators}", ExtraTreesClassifier(n_estimators=n_estimators, random_state=42)))
+    for max_depth in (None, 10):
+        specs.append((f"tree-d{max_depth or 'full'}", DecisionTreeClassifier(max_depth=max_depth, random_state=42)))
+    specs.append(("gaussian-nb", GaussianNB()))
+    specs.append(("logreg", make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000))))
+    return specs
+
+
+def _train(name, estimator, out_dir):
+    # Runs in a worker process: fit single-threaded and write the artifact. Fitting on
+    # plain arrays keeps models the app serves with list inputs free of feature-name warnings.
+    X_train, _, y_train, _ = load_dataset()
+    start = time.perf_counter()
+    estimator.fit(X_train.to_numpy(), y_train.to_numpy())
+    fit_s = time.perf_counter() - start
+    path = os.path.join(out_dir, f"{name}.pkl")
+    joblib.dump(estimator, path)
+    return {'name': name, 'path': path, 'fit_s': fit_s}
+
+
+def _median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def measure(record, X_test, y_test, batch_rows=10_000, repeat=50):
+    """Accuracy, size and latency of one trained artifact, served the way the app serves it."""
+    path = record['path']
+    load_ms = _median_ms(lambda: load_model(path), 3)
+    model = load_model(path)
+    X = X_test.to_numpy()
+    accuracy = float(np.mean(model.predict(X) == y_test.to_numpy()))
+    row = X[:1]
+    batch = X[np.random.default_rng(0).integers(0, len(X), size=batch_rows)]
+    record.update({
+        'model': type(model).__name__,
+        'accuracy': accuracy,
+        'size_kb': os.path.getsize(path) / 1024,
+        'load_ms': load_ms,
+        'single_row_ms': _median_ms(lambda: model.predict(row), repeat),
+        'batch_ms': _median_ms(lambda: model.predict(batch), 3),
+        'batch_rows': batch_rows,
+    })
+    return record
+
+
+def pareto_front(records, objectives=(('accuracy', max), ('size_kb', min), ('single_row_ms', min))):
+    """Mark records that no other record beats on every objective."""
+    def dominates(a, b):
+        better_or_equal = all((a[k] >= b[k]) if sense is max else (a[k] <= b[k]) for k, sense in objectives)
+        strictly_better = any((a[k] > b[k]) if sense is max else (a[k] < b[k]) for k, sense in objectives)
+        return better_or_equal and strictly_better
+    for r in records:
+        r['pareto'] = not any(dominates(other, r) for other in records if other is not r)
+    return [r for r in records if r['pareto']]
+
+
+def choose(records, max_accuracy_drop=0.5, max_size_kb=None, max_latency_ms=None):
+    """
+    The smallest Pareto-optimal model within `max_accuracy_drop` percentage points of
+    the best accuracy that also meets the optional size and latency budgets.
+    """
+    best = max(r['accuracy'] for r in records)
+    eligible = [
+        r for r in records
+        if r['pareto']
+        and (best - r['accuracy']) * 100 <= max_accuracy_drop
+        and (max_size_kb is None or r['size_kb'] <= max_size_kb)
+        and (max_latency_ms is None or r['single_row_ms'] <= max_latency_ms)
+    ]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['size_kb'], r['single_row_ms']))
+
+
+def write_report(records, chosen, out_dir):
+    records = sorted(records, key=lambda r: (-r['accuracy'], r['size_kb']))
+    with open(os.path.join(out_dir, 'report.json'), 'w') as f:
+        json.dump({'chosen': chosen['name'] if chosen else None, 'candidates': records}, f, indent=2)
+    lines = [
+        "# Crop model sweep",
+        "",
+        f"Chosen: **{chosen['name']}**" if chosen else "Chosen: none met the constraints",
+        "",
+        "| candidate | model | accuracy | size KB | load ms | 1-row ms | batch ms | pareto |",
+        "|---|---|---:|---:|---:|---:|---:|:---:|",
+    ]
+    for r in records:
+        lines.append(
+            f"| {r['name']} | {r['model']} | {r['accuracy'] * 100:.2f}% | {r['size_kb']:.0f} | {r['load_ms']:.1f} "
+            f"| {r['single_row_ms']:.3f} | {r['batch_ms']:.1f} | {'*' if r['pareto'] else ''} |"
+        )
+    with open(os.path.join(out_dir, 'report.md'), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep crop model variants and report the accuracy/size/latency trade-off.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Training processes.")
+    parser.add_argument('--out-dir', default=DEFAULT_OUTPUT_DIR, help="Where candidate artifacts and the report go.")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.5, help="Percentage points below the best accuracy still acceptable.")
+    parser.add_argument('--max-size-kb', type=float, default=None)
+    parser.add_argument('--max-latency-ms', type=float, default=None, help="Single-row predict budget.")
+    parser.add_argument('--export', action='store_true', help=f"Install the chosen model at {MODEL_PATH}.")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    specs = candidate_specs()
+    print(f"Training {len(specs)} candidates on {args.workers} workers...")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        trained = list(pool.map(_train, *zip(*specs), itertools.repeat(args.out_dir)))
+
+    _, X_test, _, y_test = load_dataset()
+    records = []
+    for record in trained:
+        records.append(measure(record, X_test, y_test))
+        print(f"  {record['name']:<22} acc {record['accuracy'] * 100:6.2f}%  {record['size_kb']:8.0f} KB  "
+              f"1-row {record['single_row_ms']:.3f} ms")
+
+    pareto_front(records)
+    chosen = choose(records, args.max_accuracy_drop, args.max_size_kb, args.max_latency_ms)
+    write_report(records, chosen, args.out_dir)
+    print(f"Report written to {os.path.join(args.out_dir, 'report.md')}")
+
+    if chosen is None:
+        print("No candidate met the constraints; nothing exported.")
+        return
+    print(f"Chosen: {chosen['name']} ({chosen['accuracy'] * 100:.2f}%, {chosen['size_kb']:.0f} KB, "
+          f"{chosen['single_row_ms']:.3f} ms per row)")
+    if args.export:
+        save_model(joblib.load(chosen['path']), MODEL_PATH)
+        print(f"Exported to {MODEL_PATH}")
+
+
+if __name__ == '__main__':
+    main()